@@ -0,0 +1,190 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import openmc
+
+import sfr_model
+import sfr_pins
+import sfr_post
+import sfr_sweep
+
+##############################################
+             # Benchmark Runs #
+##############################################
+
+BENCH_DIR = 'benchmarks'
+# Benchmark kinds are named after the scripts whose models they run.
+KINDS = ('SFR', 'SFR_pincell', 'SFR_full_core')
+
+
+def _sfr_pincell_model():
+    model = sfr_model.build_assembly_model()
+    sfr_pins.add_pin_tallies(model)
+    return model
+
+
+def _sfr_model():
+    return sfr_model.build_assembly_model(tallies=False)
+
+
+def _sfr_full_core_model():
+    model = sfr_model.build_core_model()
+    sfr_pins.add_pin_tallies(model)
+    return model
+
+
+# The models exactly as SFR.py, SFR_pincell.py and SFR_full_core.py run them.
+BENCH_MODELS = {
+    'SFR': _sfr_model,
+    'SFR_pincell': _sfr_pincell_model,
+    'SFR_full_core': _sfr_full_core_model,
+}
+
+# Short, fixed-seed runs: enough batches to time both phases, no triggers.
+BENCH_SETTINGS = {
+    'SFR': {'seed': 1, 'batches': 20, 'inactive': 10, 'particles': 10000,
+            'trigger_active': False},
+    'SFR_pincell': {'seed': 1, 'batches': 20, 'inactive': 10, 'particles': 10000,
+                    'trigger_active': False},
+    'SFR_full_core': {'seed': 1, 'batches': 10, 'inactive': 5, 'particles': 20000,
+                      'trigger_active': False},
+}
+
+
+def thread_counts(cores=None):
+    """Return 1, 2, 4, ... up to the available cores, always ending at the core count."""
+    cores = cores or sfr_sweep.available_cores()
+    counts = [1]
+    while counts[-1]*2 <= cores:
+        counts.append(counts[-1]*2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def _run_measured(directory, threads, openmc_exec='openmc'):
+    """Run OpenMC in `directory` and return its wall time and peak RSS [MB]."""
+    # stderr goes to a file: a pipe left unread until exit can fill up and block OpenMC.
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen([openmc_exec, '-s', str(threads)], cwd=directory,
+                                   stdout=subprocess.DEVNULL, stderr=stderr)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, process.args,
+                                                stderr=stderr.read().decode(errors='replace'))
+    return wall, usage.ru_maxrss/1024
+
+
+def benchmark(kind, threads, directory=BENCH_DIR, openmc_exec='openmc'):
+    """Run one benchmark case and return its timing record."""
+    settings = BENCH_SETTINGS[kind]
+    run_dir = os.path.join(directory, kind)
+    model = BENCH_MODELS[kind]()
+    for name, value in settings.items():
+        setattr(model.settings, name, value)
+    sfr_model.export_model(model, run_dir)
+    sfr_post.clear_statepoints(run_dir)
+    wall, peak_mb = _run_measured(run_dir, threads, openmc_exec)
+
+    with openmc.StatePoint(sfr_post.final_statepoint(run_dir)) as sp:
+        runtime = dict(sp.runtime)
+        keff = [sp.keff.nominal_value, sp.keff.std_dev]
+    n_inactive = settings['inactive']
+    n_active = settings['batches'] - n_inactive
+    particles = settings['particles']
+
+    return {
+        'kind': kind,
+        'threads': threads,
+        'wall_time': wall,
+        'peak_memory_mb': peak_mb,
+        'initialization_time': runtime.get('total initialization'),
+        'inactive_rate': n_inactive*particles/runtime['inactive batches'],
+        'active_rate': n_active*particles/runtime['active batches'],
+        'keff': keff,
+        'runtime': runtime,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(kinds=KINDS, threads=None, directory=BENCH_DIR, output=None,
+              openmc_exec='openmc'):
+    """Benchmark every model kind at every thread count and write the results as JSON."""
+    threads = threads or thread_counts()
+    results = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'openmc_version': openmc.__version__,
+        'host': platform.node(),
+        'cores': sfr_sweep.available_cores(),
+        'runs': [],
+    }
+    for kind in kinds:
+        for n in threads:
+            record = benchmark(kind, n, directory, openmc_exec)
+            results['runs'].append(record)
+            print(f"{kind:13s} {n:3d} threads: {record['active_rate']:10.0f} particles/s active, "
+                  f"{record['peak_memory_mb']:8.1f} MB")
+
+    os.makedirs(directory, exist_ok=True)
+    output = output or os.path.join(directory, f"bench-{(results['commit'] or 'local')[:12]}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    return output
+
+##############################################
+            # Regression Check #
+##############################################
+
+def compare(baseline, current, tolerance=0.10):
+    """Return the runs of `current` whose particle rates fell more than `tolerance` below `baseline`."""
+    with open(baseline) as f:
+        before = {(r['kind'], r['threads']): r for r in json.load(f)['runs']}
+    with open(current) as f:
+        after = json.load(f)['runs']
+
+    regressions = []
+    for run in after:
+        ref = before.get((run['kind'], run['threads']))
+        if ref is None:
+            continue
+        for rate in ('inactive_rate', 'active_rate'):
+            change = run[rate]/ref[rate] - 1
+            if change < -tolerance:
+                regressions.append({'kind': run['kind'], 'threads': run['threads'],
+                                    'metric': rate, 'change': change})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the SFR models.")
+    parser.add_argument('--kinds', nargs='+', default=list(KINDS), choices=KINDS)
+    parser.add_argument('--threads', nargs='+', type=int)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', metavar='BASELINE')
+    args = parser.parse_args()
+
+    path = run_suite(args.kinds, args.threads, output=args.output)
+    print(f"Results written to {path}")
+    if args.compare:
+        for r in compare(args.compare, path):
+            print(f"REGRESSION {r['kind']} {r['threads']} threads {r['metric']}: "
+                  f"{100*r['change']:+.1f}%")
@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+
+import openmc
+import openmc.deplete
+
+import sfr_model
+import sfr_post
+import sfr_source
+
+##############################################
+            # Depletion Setup #
+##############################################
+
+DEPLETE_DIR = 'depletion'
+RESULTS_FILE = 'depletion_results.h5'
+CHECKPOINT = 'depletion_results.checkpoint.h5'
+DEPLETION_SOURCE = 'depletion_source.h5'
+REDUCED_CHAIN = 'chain_sfr.xml'
+
+INTEGRATORS = {
+    'predictor': openmc.deplete.PredictorIntegrator,
+    'cecm': openmc.deplete.CECMIntegrator,
+    'celi': openmc.deplete.CELIIntegrator,
+    'leqi': openmc.deplete.LEQIIntegrator,
+    'epcrk4': openmc.deplete.EPCRK4Integrator,
+    'cf4': openmc.deplete.CF4Integrator,
+    'si-celi': openmc.deplete.SICELIIntegrator,
+    'si-leqi': openmc.deplete.SILEQIIntegrator,
+}
+
+# Days per step: short first steps while short-lived fission products reach
+# equilibrium, then a cycle in 90 day steps.
+DEFAULT_TIMESTEPS = [1, 10, 30, 60, 90, 90, 90, 90]
+# Fission yields are taken from the chain's 500 keV set instead of the thermal one.
+FAST_YIELD_ENERGY = 5.0e5
+
+
+def hex_count(n_rings):
+    """Return the number of positions in a hex lattice of `n_rings` rings."""
+    return 3*n_rings*(n_rings - 1) + 1
+
+
+def fuel_volumes(kind, params=None):
+    """Return the total fuel volume per zone [cm3] of a model.
+
+    The pincell and assembly models are infinite axially, so their volumes
+    are per cm of height; power density normalisation is unaffected.
+    """
+    params = sfr_model.make_params(**(params or {}))
+
+    def pin_area(zone):
+        return math.pi*params[f'{zone}_fuel_radius']**2
+
+    if kind == 'pincell':
+        return {'inner': pin_area('inner')}
+    if kind == 'assembly':
+        return {'inner': pin_area('inner')*hex_count(params['assembly_rings'])}
+
+    n_inner = params['core_inner_rings']
+    n_fuel = n_inner + params['core_outer_rings']
+    assemblies = {'inner': hex_count(n_inner),
+                  'outer': hex_count(n_fuel) - hex_count(n_inner)}
+    return {zone: pin_area(zone)*hex_count(params[f'{zone}_assembly_rings'])
+            * assemblies[zone]*params['core_height'] for zone in assemblies}
+
+
+def reduced_chain(model, chain_file=None, path=REDUCED_CHAIN, level=None):
+    """Return a depletion chain reduced to what the model's fuel can reach.
+
+    The reduced chain is written next to `path` with a hash of the full
+    chain, `level` and the fuel nuclides in its name, and reused while it
+    is newer than the full chain.
+    """
+    chain_file = chain_file or openmc.config.get('chain_file')
+    if chain_file is None:
+        raise ValueError("No depletion chain given and openmc.config['chain_file'] is unset")
+    initial = sorted({nuclide for material in model.materials if material.depletable
+                      for nuclide in material.get_nuclides()})
+    blob = json.dumps({'chain': os.path.abspath(chain_file), 'level': level,
+                       'nuclides': initial})
+    root, ext = os.path.splitext(path)
+    path = f"{root}-{hashlib.sha256(blob.encode()).hexdigest()[:12]}{ext}"
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(chain_file):
+        return path
+
+    chain = openmc.deplete.Chain.from_xml(chain_file).reduce(initial, level)
+    chain.export_to_xml(path + '.part')
+    os.replace(path + '.part', path)
+    return path
+
+
+def depletion_model(kind='pincell', params=None, particles=10000, batches=60, inactive=20):
+    """Return a model of `kind` with depletable fuel and fixed, trigger-free statistics."""
+    model = sfr_model.build_model(kind, params)
+    volumes = fuel_volumes(kind, params)
+    for material in model.materials:
+        zone = material.name.split()[1] if material.name.startswith('metallic') else None
+        if zone in volumes:
+            material.depletable = True
+            material.volume = volumes[zone]
+    model.settings.particles = particles
+    model.settings.batches = batches
+    model.settings.inactive = inactive
+    model.settings.trigger_active = False
+    return model
+
+##############################################
+         # Checkpointed Depletion #
+##############################################
+
+def _load_results(directory):
+    """Return the results so far, falling back to the last checkpoint if the file is damaged."""
+    for name in (RESULTS_FILE, CHECKPOINT):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            try:
+                return openmc.deplete.Results(path), path
+            except (OSError, KeyError):
+                continue
+    return None, None
+
+
+def _check_restart(results):
+    """Raise ValueError if the last results entry cannot start the next step.
+
+    A restarted step takes its beginning-of-step k-eff and reaction rates
+    from this entry, so it must come from an end-of-step transport run.
+    """
+    last = results[-1]
+    if not last.k[0][0] > 0 or not last.rates[0].any():
+        raise ValueError(f"Last depletion entry (step {len(results) - 1}) has no transport "
+                         "solution; remove the results to restart the depletion")
+
+
+def completed_steps(directory=DEPLETE_DIR):
+    """Return how many depletion steps of a run in `directory` are finished."""
+    results, _ = _load_results(directory)
+    return 0 if results is None else len(results) - 1
+
+
+def deplete(kind='pincell', params=None, timesteps=DEFAULT_TIMESTEPS, power_density=40.0,
+            integrator='cecm', directory=DEPLETE_DIR, chain_file=None, chain_level=None,
+            particles=10000, batches=60, inactive=20, warm_inactive=sfr_source.WARM_INACTIVE):
+    """Deplete a model over `timesteps` [d] at `power_density` [W/gHM], resumably.
+
+    Each step is integrated on its own, ending with a transport run whose
+    k-eff and reaction rates begin the next step, and the results file is
+    checkpointed after it, so a killed job restarts from the last finished step. Every
+    step after the first starts from the fission source of the previous
+    step's final transport and runs only `warm_inactive` inactive batches.
+    Returns the :class:`openmc.deplete.Results`.
+    """
+    chain_file = os.path.abspath(chain_file) if chain_file else None
+    os.makedirs(directory, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        results, path = _load_results('.')
+        if path == CHECKPOINT:
+            shutil.copyfile(CHECKPOINT, RESULTS_FILE)
+            results = openmc.deplete.Results(RESULTS_FILE)
+        done = 0 if results is None else len(results) - 1
+        if done:
+            _check_restart(results)
+            print(f"Resuming {kind} depletion after step {done} of {len(timesteps)}")
+
+        for step in range(done, len(timesteps)):
+            model = depletion_model(kind, params, particles, batches, inactive)
+            chain = reduced_chain(model, chain_file, level=chain_level)
+            if os.path.exists(DEPLETION_SOURCE):
+                model.settings.source = openmc.FileSource(DEPLETION_SOURCE)
+                model.settings.inactive = warm_inactive
+
+            operator = openmc.deplete.CoupledOperator(
+                model, chain, prev_results=results, fission_yield_mode='constant',
+                fission_yield_opts={'energy': FAST_YIELD_ENERGY})
+            sfr_post.clear_statepoints()
+            # The end-of-step transport is the next step's beginning-of-step state.
+            INTEGRATORS[integrator](operator, [timesteps[step]], power_density=power_density,
+                                    timestep_units='d').integrate(final_step=True)
+
+            sfr_source.source_from_statepoint(sfr_post.final_statepoint(),
+                                              DEPLETION_SOURCE + '.part')
+            os.replace(DEPLETION_SOURCE + '.part', DEPLETION_SOURCE)
+            shutil.copyfile(RESULTS_FILE, CHECKPOINT + '.part')
+            os.replace(CHECKPOINT + '.part', CHECKPOINT)
+            results = openmc.deplete.Results(RESULTS_FILE)
+            _check_restart(results)
+            k, k_std = results.get_keff()[1][step + 1]
+            print(f"Step {step + 1}/{len(timesteps)} done: "
+                  f"end-of-step k-eff = {k:.5f} +/- {k_std:.5f}")
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Checkpointed SFR depletion.")
+    parser.add_argument('kind', choices=['pincell', 'assembly', 'core'])
+    parser.add_argument('--integrator', choices=sorted(INTEGRATORS), default='cecm')
+    parser.add_argument('--power-density', type=float, default=40.0, help="W/gHM")
+    parser.add_argument('--timesteps', type=float, nargs='+', default=DEFAULT_TIMESTEPS,
+                        help="step lengths in days")
+    parser.add_argument('--chain')
+    parser.add_argument('--particles', type=int, default=10000)
+    parser.add_argument('--directory', default=DEPLETE_DIR)
+    args = parser.parse_args()
+
+    results = deplete(args.kind, timesteps=args.timesteps, power_density=args.power_density,
+                      integrator=args.integrator, directory=args.directory,
+                      chain_file=args.chain, particles=args.particles)
+    time, keff = results.get_keff(time_units='d')
+    for t, (k, std) in zip(time, keff):
+        print(f"{t:8.1f} d  k-eff = {k:.5f} +/- {std:.5f}")
@@ -0,0 +1,128 @@
+import json
+import math
+import warnings
+
+import numpy as np
+import openmc
+
+import sfr_model
+import sfr_post
+import sfr_source
+
+##############################################
+           # Convergence Analysis #
+##############################################
+
+RECOMMENDATIONS = 'inactive_batches.json'
+# Active batches a recommendation must leave within the run's batch count.
+MIN_ACTIVE = 10
+
+
+def read_convergence(statepoint):
+    """Return the entropy, per-generation k-eff, inactive and total batches of a statepoint."""
+    with openmc.StatePoint(statepoint) as sp:
+        entropy = np.asarray(sp.entropy) if sp.entropy is not None else np.array([])
+        return entropy, np.asarray(sp.k_generation), sp.n_inactive, sp.n_batches
+
+
+def converged_batch(series, n_sigma=2.0, window=5, reference_fraction=0.5):
+    """Return the number of leading values to discard before `series` is stationary.
+
+    The stationary band is the mean +/- `n_sigma` standard deviations of the
+    last `reference_fraction` of the series; the series is converged from the
+    first value that starts `window` consecutive values inside that band.
+    """
+    series = np.asarray(series, dtype=float)
+    if series.size < 2*window:
+        return series.size
+    reference = series[int(series.size*(1 - reference_fraction)):]
+    mean, std = reference.mean(), reference.std(ddof=1)
+    inside = np.abs(series - mean) <= n_sigma*max(std, 1e-12)
+    runs = np.convolve(inside.astype(int), np.ones(window, dtype=int), 'valid')
+    hits = np.flatnonzero(runs == window)
+    return int(hits[0]) if hits.size else series.size
+
+
+def select_inactive(entropy, k_generation, margin=0.2, minimum=3, batches=None,
+                    min_active=MIN_ACTIVE, **kwargs):
+    """Return an inactive batch count from the measured entropy and k-eff convergence.
+
+    With `batches` given, the count leaves at least `min_active` active
+    batches. A series that never converged warns and asks for as many
+    inactive batches as that allows.
+    """
+    series = [s for s in (entropy, k_generation) if len(s)]
+    converged = [converged_batch(s, **kwargs) for s in series]
+    if any(c == len(s) for c, s in zip(converged, series)):
+        warnings.warn("Entropy or k-eff did not converge within the run; "
+                      "increase the batch count")
+        inactive = math.inf
+    else:
+        inactive = math.ceil(max(converged, default=0)*(1 + margin))
+    if batches is not None:
+        inactive = min(inactive, batches - min_active)
+    elif inactive == math.inf:
+        inactive = max(len(s) for s in series)
+    return max(minimum, inactive)
+
+
+def analyze(directory='.', **kwargs):
+    """Return a convergence report for the final statepoint in `directory`."""
+    statepoint = sfr_post.final_statepoint(directory)
+    entropy, k_generation, used, batches = read_convergence(statepoint)
+    recommended = select_inactive(entropy, k_generation, batches=batches, **kwargs)
+    return {
+        'statepoint': statepoint,
+        'inactive_used': used,
+        'entropy_converged': converged_batch(entropy) if len(entropy) else None,
+        'keff_converged': converged_batch(k_generation),
+        'recommended_inactive': recommended,
+        'sufficient': used >= recommended,
+    }
+
+##############################################
+        # Inactive Batch Feedback #
+##############################################
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def recommended_inactive(family, default=None, path=RECOMMENDATIONS):
+    """Return the inactive batch count recorded for a model family, or `default`."""
+    return _load(path).get(family, default)
+
+
+def record_inactive(family, inactive, path=RECOMMENDATIONS):
+    """Record the inactive batch count the next run of a model family should use."""
+    recommendations = _load(path)
+    recommendations[family] = int(inactive)
+    with open(path, 'w') as f:
+        json.dump(recommendations, f, indent=2, sort_keys=True)
+
+
+def run_auto_inactive(kind, params=None, directory='.', threads=None, settings=None,
+                      path=RECOMMENDATIONS):
+    """Run a model with its family's measured inactive count and update the record.
+
+    The first run of a family uses the model's default inactive count. If the
+    report shows it was not enough, the result is flagged as not sufficient
+    and the next run uses the larger recommendation.
+    """
+    family = sfr_source.family_key(kind, params)
+    overrides = dict(settings or {})
+    inactive = recommended_inactive(family, path=path)
+    if inactive is not None:
+        overrides['inactive'] = inactive
+
+    sfr_model.prepare_model(kind, params, directory, settings=overrides)
+    sfr_post.clear_statepoints(directory)
+    openmc.run(threads=threads, cwd=directory, output=False)
+
+    report = analyze(directory)
+    record_inactive(family, report['recommended_inactive'], path)
+    return report
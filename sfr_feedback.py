@@ -0,0 +1,204 @@
+import json
+import math
+import os
+
+import numpy as np
+import openmc
+import openmc.lib
+
+import sfr_pins
+import sfr_session
+
+##############################################
+             # Thermal Model #
+##############################################
+
+FEEDBACK_DIR = 'feedback'
+
+# Core thermal-hydraulic data in SI units. The flow is split evenly between
+# fuel assemblies.
+THERMAL = {
+    'power': 300.0e6,               # W
+    'flow_rate': 1575.0,            # kg/s through all fuel assemblies
+    'inlet_temperature': 628.0,     # K
+    'sodium_cp': 1270.0,            # J/kg-K
+    'fuel_conductivity': 20.0,      # W/m-K, U-Pu-Zr
+    'clad_conductivity': 20.0,      # W/m-K, stainless steel
+    'gap_conductance': 1.0e5,       # W/m2-K
+    'film_coefficient': 1.0e5,      # W/m2-K, sodium
+}
+
+
+def sodium_density(temperature):
+    """Return the density [g/cm3] of liquid sodium at `temperature` [K]."""
+    return (1014.0 - 0.235*np.asarray(temperature))/1000.0
+
+
+def assembly_temperatures(power, n_pins, zone, params, thermal=THERMAL, n_assemblies=None):
+    """Return the mean coolant and mean fuel temperature [K] of assemblies at `power` [W].
+
+    The coolant heats up linearly along the assembly, so its mean is the
+    inlet plus half the rise. The fuel adds the film, clad, gap and
+    volume-averaged pellet temperature drops at the mean linear heat rate.
+    """
+    power = np.asarray(power, dtype=float)
+    n_assemblies = n_assemblies or power.size
+    flow = thermal['flow_rate']/n_assemblies
+    coolant = thermal['inlet_temperature'] + 0.5*power/(flow*thermal['sodium_cp'])
+
+    linear = power/(n_pins*params['core_height']/100.0)
+    r_fuel = params[f'{zone}_fuel_radius']/100.0
+    r_ci = params[f'{zone}_clad_inner_radius']/100.0
+    r_co = params[f'{zone}_clad_outer_radius']/100.0
+    rise = linear*(1.0/(2*math.pi*r_co*thermal['film_coefficient'])
+                   + math.log(r_co/r_ci)/(2*math.pi*thermal['clad_conductivity'])
+                   + 1.0/(2*math.pi*r_fuel*thermal['gap_conductance'])
+                   + 1.0/(8*math.pi*thermal['fuel_conductivity']))
+    return coolant, coolant + rise
+
+##############################################
+            # Feedback Iteration #
+##############################################
+
+class FeedbackSession(sfr_session.Session):
+    """A Session whose fuel and pin coolant cells take per-assembly temperatures and densities.
+
+    Every fuel assembly gets its own sodium material in the coolant cell of
+    its pins (a distributed material fill), so its density can be changed
+    in memory; fuel and coolant temperatures are set per distribcell
+    instance.
+    """
+
+    def __init__(self, kind='core', params=None, directory=FEEDBACK_DIR, threads=None,
+                 temperature_range=(500.0, 2000.0)):
+        super().__init__(kind, params, directory, threads, temperature_range)
+        self.model.settings.trigger_active = False
+        sfr_pins.add_pin_tallies(self.model)
+        sodium = next(m for m in self.model.materials if m.name == 'sodium coolant')
+
+        self.zones = {}
+        for zone in sfr_pins.FUEL_ZONES:
+            universe = next((u for u in self.model.geometry.get_all_universes().values()
+                             if u.name == f"{zone} pin"), None)
+            if universe is None:
+                continue
+            cells = {cell.name: cell for cell in universe.cells.values()}
+            pins = sfr_pins.pin_map(kind, zone, self.params)
+            assemblies, instance_assembly = np.unique(pins['assembly'], return_inverse=True)
+            coolants = []
+            for a in assemblies:
+                material = sodium.clone()
+                material.name = f"sodium coolant {zone} assembly {a}"
+                coolants.append(material)
+            self.model.materials.extend(coolants)
+            cells['sodium coolant'].fill = [coolants[i] for i in instance_assembly.ravel()]
+            self.zones[zone] = {
+                'fuel_cell': cells[f"{zone} fuel cell"],
+                'coolant_cell': cells['sodium coolant'],
+                'assemblies': assemblies,
+                'instance_assembly': instance_assembly.ravel(),
+                'pins_per_assembly': len(pins['assembly'])//len(assemblies),
+                'coolants': coolants,
+            }
+
+        self._material_ids = {m.name: m.id for m in self.model.materials}
+        self._tally_ids = {t.name: t.id for t in self.model.tallies}
+        self._cells = [c for c in self.model.geometry.get_all_material_cells().values()
+                       if isinstance(c.fill, openmc.Material)]
+
+    def set_assembly_state(self, zone, fuel_temperature, coolant_temperature):
+        """Set per-assembly fuel/coolant temperatures [K] and the matching sodium densities."""
+        data = self.zones[zone]
+        fuel_cell = openmc.lib.cells[data['fuel_cell'].id]
+        coolant_cell = openmc.lib.cells[data['coolant_cell'].id]
+        for instance, a in enumerate(data['instance_assembly']):
+            fuel_cell.set_temperature(fuel_temperature[a], instance)
+            coolant_cell.set_temperature(coolant_temperature[a], instance)
+        for material, density in zip(data['coolants'], sodium_density(coolant_temperature)):
+            openmc.lib.materials[material.id].set_density(float(density), 'g/cm3')
+
+    def assembly_power(self, result, power=THERMAL['power']):
+        """Return per-assembly power [W] and its relative error by zone from a run_variant result.
+
+        Tallied kappa-fission is normalized so the fuel assemblies produce `power` [W].
+        """
+        powers, errors = {}, {}
+        for zone, data in self.zones.items():
+            tally = result[f'{zone} pin power']
+            mean, std = tally['mean'][:, 1], tally['std_dev'][:, 1]
+            n = len(data['assemblies'])
+            powers[zone] = np.bincount(data['instance_assembly'], mean, n)
+            variance = np.bincount(data['instance_assembly'], std**2, n)
+            errors[zone] = np.sqrt(variance)/np.maximum(powers[zone], 1e-30)
+        total = sum(p.sum() for p in powers.values())
+        scale = power/total if total > 0 else 0.0
+        return {zone: p*scale for zone, p in powers.items()}, errors
+
+
+def iterate(kind='core', params=None, thermal=THERMAL, relaxation=0.5, tolerance=2.0,
+            max_iterations=20, particles=5000, max_particles=80000, directory=FEEDBACK_DIR,
+            threads=None):
+    """Iterate transport and the thermal model to a fixed point and return the history.
+
+    Temperatures are relaxed, T = T_old + relaxation*(T_new - T_old), and
+    the iteration stops once no assembly's fuel temperature moves by more
+    than `tolerance` [K] at `max_particles`. Particles are quadrupled
+    whenever the statistical noise in assembly power becomes comparable to
+    the change between iterations, so early iterations stay cheap.
+    """
+    history = []
+    with FeedbackSession(kind, params, directory, threads) as session:
+        n_fuel = sum(len(d['assemblies']) for d in session.zones.values())
+        state = {zone: {'fuel': np.full(len(d['assemblies']), thermal['inlet_temperature']),
+                        'coolant': np.full(len(d['assemblies']), thermal['inlet_temperature'])}
+                 for zone, d in session.zones.items()}
+        previous_power = None
+        for iteration in range(max_iterations):
+            openmc.lib.settings.particles = particles
+            for zone, s in state.items():
+                session.set_assembly_state(zone, s['fuel'], s['coolant'])
+            result = session.run_variant(tallies=[f'{zone} pin power' for zone in session.zones])
+            powers, errors = session.assembly_power(result, thermal['power'])
+
+            change = 0.0
+            for zone, power in powers.items():
+                coolant, fuel = assembly_temperatures(
+                    power, session.zones[zone]['pins_per_assembly'], zone, session.params,
+                    thermal, n_fuel)
+                s = state[zone]
+                change = max(change, np.abs(fuel - s['fuel']).max())
+                s['fuel'] = s['fuel'] + relaxation*(fuel - s['fuel'])
+                s['coolant'] = s['coolant'] + relaxation*(coolant - s['coolant'])
+
+            noise = max(e.max() for e in errors.values())
+            power_change = (max(np.abs(powers[z]/previous_power[z] - 1).max() for z in powers)
+                            if previous_power else np.inf)
+            previous_power = powers
+            history.append({
+                'iteration': iteration,
+                'particles': particles,
+                'keff': result['keff'],
+                'keff_std': result['keff_std'],
+                'max_fuel_change': float(change),
+                'max_power_error': float(noise),
+                'max_fuel_temperature': float(max(s['fuel'].max() for s in state.values())),
+                'max_coolant_temperature': float(max(s['coolant'].max() for s in state.values())),
+            })
+            print(f"Iteration {iteration}: k-eff = {result['keff']:.5f}, "
+                  f"max fuel change {change:.1f} K ({particles} particles)")
+
+            if change < tolerance and particles >= max_particles:
+                break
+            if power_change < 2*noise or change < tolerance:
+                particles = min(4*particles, max_particles)
+
+    with open(os.path.join(directory, 'feedback.json'), 'w') as f:
+        json.dump({'history': history,
+                   'state': {zone: {k: v.tolist() for k, v in s.items()}
+                             for zone, s in state.items()}}, f, indent=2)
+    return history, state
+
+
+if __name__ == '__main__':
+    history, _ = iterate()
+    print(f"Converged after {len(history)} iterations, k-eff = {history[-1]['keff']:.5f}")
@@ -0,0 +1,245 @@
+import hashlib
+import re
+
+import numpy as np
+import openmc
+
+##############################################
+            # Loading Map Format #
+##############################################
+
+# A loading map describes a hex lattice ring by ring, centre ring 0:
+#
+#     # full core, one 60 degree sector per ring
+#     rings 11
+#     orientation x
+#     symmetry 6
+#     ring 0-3 I             one symbol fills whole rings
+#     ring 4-6 O
+#     ring 7-10 R
+#     ring 5 I O*3 I         or one symbol per position, S*k repeats S
+#
+# With symmetry s, rings list 6r/s positions, which are repeated s times
+# around the ring. Positions follow HexLattice.universes order, so position
+# p of ring r is ``universes[rings - 1 - r][p]``. Later lines override
+# earlier ones; `default S` fills every ring not given.
+
+CORE_SYMBOLS = {'I': 'inner', 'O': 'outer', 'R': 'reflector'}
+SYMMETRIES = (1, 2, 3, 6)
+
+
+def ring_size(ring, symmetry=1):
+    """Return the number of positions listed for `ring` under `symmetry`."""
+    return 1 if ring == 0 else 6*ring//symmetry
+
+
+def _expand_tokens(tokens):
+    symbols = []
+    for token in tokens:
+        symbol, _, count = token.partition('*')
+        symbols += [symbol]*(int(count) if count else 1)
+    return symbols
+
+
+def parse_loading_map(text):
+    """Return the loading map dict described by `text`."""
+    spec = {'rings': None, 'orientation': 'y', 'symmetry': 1, 'default': None, 'map': {}}
+    for number, line in enumerate(text.splitlines(), 1):
+        words = line.split('#', 1)[0].split()
+        if not words:
+            continue
+        key, args = words[0], words[1:]
+        try:
+            if key == 'rings':
+                spec['rings'] = int(args[0])
+            elif key == 'orientation':
+                if args[0] not in ('x', 'y'):
+                    raise ValueError(f"orientation must be 'x' or 'y', not '{args[0]}'")
+                spec['orientation'] = args[0]
+            elif key == 'symmetry':
+                spec['symmetry'] = int(args[0])
+                if spec['symmetry'] not in SYMMETRIES:
+                    raise ValueError(f"symmetry must be one of {SYMMETRIES}")
+            elif key == 'default':
+                spec['default'] = args[0]
+            elif key == 'ring':
+                match = re.fullmatch(r'(\d+)(?:-(\d+))?', args[0])
+                if match is None or len(args) < 2:
+                    raise ValueError("expected 'ring R[-R] SYMBOL ...'")
+                first = int(match.group(1))
+                last = int(match.group(2) or first)
+                symbols = _expand_tokens(args[1:])
+                fill = len(args) == 2 and '*' not in args[1]
+                for ring in range(first, last + 1):
+                    spec['map'][ring] = symbols*ring_size(ring, spec['symmetry']) if fill \
+                        else symbols
+            else:
+                raise ValueError(f"unknown keyword '{key}'")
+        except (ValueError, IndexError) as err:
+            raise ValueError(f"Loading map line {number}: {err}") from None
+
+    if spec['rings'] is None:
+        spec['rings'] = max(spec['map'], default=-1) + 1
+    validate(spec)
+    return spec
+
+
+def read_loading_map(path):
+    """Return the loading map stored in the file `path`."""
+    with open(path) as f:
+        return parse_loading_map(f.read())
+
+
+def as_loading_map(loading):
+    """Return `loading` as a loading map dict; it may be a dict, map text or a file path."""
+    if isinstance(loading, dict):
+        validate(loading)
+        return loading
+    if '\n' in loading:
+        return parse_loading_map(loading)
+    return read_loading_map(loading)
+
+
+def validate(spec):
+    """Raise ValueError if a loading map has missing rings or wrong position counts."""
+    for ring in range(spec['rings']):
+        symbols = spec['map'].get(ring)
+        if symbols is None:
+            if spec.get('default') is None:
+                raise ValueError(f"Loading map has no ring {ring} and no default")
+            continue
+        size = ring_size(ring, spec['symmetry'])
+        if len(symbols) != size:
+            raise ValueError(f"Loading map ring {ring} lists {len(symbols)} positions, "
+                             f"expected {size} for symmetry {spec['symmetry']}")
+    extra = [ring for ring in spec['map'] if ring >= spec['rings']]
+    if extra:
+        raise ValueError(f"Loading map rings {extra} are outside its {spec['rings']} rings")
+
+
+def loading_key(loading):
+    """Return a short hash of a loading map's content, independent of how it was written."""
+    text = format_loading_map(as_loading_map(loading))
+    return hashlib.sha256(text.encode()).hexdigest()[:12]
+
+
+def format_loading_map(spec):
+    """Return the text form of a loading map, merging uniform rings into ranges."""
+    lines = [f"rings {spec['rings']}", f"orientation {spec['orientation']}",
+             f"symmetry {spec['symmetry']}"]
+    if spec.get('default') is not None:
+        lines.append(f"default {spec['default']}")
+
+    def uniform(ring):
+        symbols = spec['map'].get(ring)
+        return symbols[0] if symbols and len(set(symbols)) == 1 else None
+
+    ring = 0
+    while ring < spec['rings']:
+        if ring not in spec['map']:
+            ring += 1
+            continue
+        symbol = uniform(ring)
+        if symbol is not None:
+            last = ring
+            while last + 1 < spec['rings'] and uniform(last + 1) == symbol:
+                last += 1
+            lines.append(f"ring {ring}-{last} {symbol}" if last > ring else f"ring {ring} {symbol}")
+            ring = last + 1
+            continue
+        tokens, symbols = [], spec['map'][ring]
+        start = 0
+        while start < len(symbols):
+            stop = start
+            while stop < len(symbols) and symbols[stop] == symbols[start]:
+                stop += 1
+            tokens.append(symbols[start] if stop - start == 1
+                          else f"{symbols[start]}*{stop - start}")
+            start = stop
+        lines.append(f"ring {ring} {' '.join(tokens)}")
+        ring += 1
+    return '\n'.join(lines) + '\n'
+
+##############################################
+          # Lattice Generation #
+##############################################
+
+def ring_symbols(spec):
+    """Return the full symbol list of every ring, outermost ring first.
+
+    Each ring's symmetry sector is repeated around the ring, giving the
+    nested layout of ``HexLattice.universes``.
+    """
+    rings = []
+    for ring in range(spec['rings'] - 1, -1, -1):
+        symbols = spec['map'].get(ring)
+        if symbols is None:
+            symbols = [spec['default']]*ring_size(ring, spec['symmetry'])
+        rings.append(list(symbols) if ring == 0 else list(symbols)*spec['symmetry'])
+    return rings
+
+
+def sector_symmetric(spec, sector):
+    """Return whether a loading map is unchanged by the symmetry a core `sector` relies on.
+
+    A 60 degree sector needs 6-fold rotational symmetry; a 30 degree sector
+    also needs the map mirrored about the +x axis.
+    """
+    for ring, symbols in enumerate(reversed(ring_symbols(spec))):
+        if ring == 0:
+            continue
+        size = 6*ring
+        if any(symbols[p] != symbols[(p + ring) % size] for p in range(size)):
+            return False
+        # Position 0 sits on the +x axis for 'x' lattices and at the top for 'y' lattices.
+        offset = 0 if spec['orientation'] == 'x' else 3*ring
+        if sector == 30 and any(symbols[p] != symbols[(offset - p) % size]
+                                for p in range(size)):
+            return False
+    return True
+
+
+def lattice_universes(spec, universes):
+    """Return ``HexLattice.universes`` for a loading map.
+
+    `universes` maps each symbol to a universe; every position holding the
+    same symbol refers to the same universe instance.
+    """
+    missing = {s for ring in ring_symbols(spec) for s in ring} - set(universes)
+    if missing:
+        raise KeyError(f"No universe given for loading map symbols {sorted(missing)}")
+    return [[universes[s] for s in ring] for ring in ring_symbols(spec)]
+
+
+def build_lattice(spec, universes, pitch, outer=None, center=(0., 0.), name=''):
+    """Return a HexLattice filled from a loading map."""
+    lattice = openmc.HexLattice(name=name)
+    lattice.center = center
+    lattice.pitch = (pitch,)
+    lattice.orientation = spec['orientation']
+    lattice.outer = outer
+    lattice.universes = lattice_universes(spec, universes)
+    return lattice
+
+
+def symbols_at(spec, ring, position):
+    """Return the symbol at each (`ring`, `position`) pair as an array."""
+    rings = ring_symbols(spec)
+    ring, position = np.asarray(ring), np.asarray(position)
+    return np.array([rings[spec['rings'] - 1 - r][p] for r, p in zip(ring.ravel(),
+                                                                     position.ravel())])
+
+
+def core_loading(params):
+    """Return the zoned loading map of the reference core: inner, outer, then reflector rings."""
+    n_inner, n_outer = params['core_inner_rings'], params['core_outer_rings']
+    n_rings = n_inner + n_outer + params['core_reflector_rings']
+    zone = {ring: 'I' if ring < n_inner else 'O' if ring < n_inner + n_outer else 'R'
+            for ring in range(n_rings)}
+    return {
+        'rings': n_rings,
+        'orientation': 'x',
+        'symmetry': 6,
+        'default': None,
+        'map': {ring: [symbol]*ring_size(ring, 6) for ring, symbol in zone.items()},
+    }
@@ -0,0 +1,97 @@
+import os
+import shutil
+import sys
+
+import h5py
+import numpy as np
+
+import sfr_post
+
+##############################################
+          # Independent Run Merging #
+##############################################
+
+MERGED = 'merged_statepoint.h5'
+
+
+def seeded_settings(index, base_seed=1):
+    """Return settings overrides for the `index`-th independent copy of a run."""
+    return {'seed': base_seed + index}
+
+
+def combine_keff(estimates):
+    """Return the inverse-variance weighted mean and standard deviation of k-eff values."""
+    estimates = np.asarray(estimates, dtype=float)
+    weights = 1.0/estimates[:, 1]**2
+    mean = np.sum(weights*estimates[:, 0])/weights.sum()
+    return mean, 1.0/np.sqrt(weights.sum())
+
+
+def _tally_groups(f):
+    return [name for name in f['tallies'] if name.startswith('tally ')]
+
+
+def merge_statepoints(paths, output=MERGED):
+    """Merge statepoints of independently seeded runs of one model into `output`.
+
+    Tally sums and sums of squares are added and their realization counts
+    summed, so every tally mean and standard deviation in the merged file is
+    the one a single run with all active batches would have reported. The
+    combined k-eff is the inverse-variance weighted mean of the runs. The
+    output is a copy of the first statepoint with the merged results, so
+    ``openmc.StatePoint`` and the existing plotting code read it unchanged.
+    """
+    if len(paths) < 2:
+        raise ValueError("Need at least two statepoints to merge")
+
+    with h5py.File(paths[0], 'r') as f:
+        names = _tally_groups(f)
+        totals = {name: np.zeros_like(f['tallies'][name]['results'][()]) for name in names}
+        global_totals = np.zeros_like(f['global_tallies'][()])
+    realizations = {name: 0 for name in names}
+    n_total, keff, seeds = 0, [], []
+
+    for path in paths:
+        with h5py.File(path, 'r') as f:
+            if _tally_groups(f) != names:
+                raise ValueError(f"'{path}' has different tallies from '{paths[0]}'")
+            seeds.append(int(f['seed'][()]))
+            keff.append(f['k_combined'][()])
+            n_total += int(f['n_realizations'][()])
+            global_totals += f['global_tallies'][()]
+            for name in names:
+                group = f['tallies'][name]
+                results = group['results'][()]
+                if results.shape != totals[name].shape:
+                    raise ValueError(f"'{path}' {name} has shape {results.shape}, "
+                                     f"expected {totals[name].shape}")
+                totals[name] += results
+                realizations[name] += int(group['n_realizations'][()])
+
+    if len(set(seeds)) != len(seeds):
+        raise ValueError(f"Statepoints share random number seeds {seeds}; "
+                         "their batches are not independent")
+
+    partial = output + '.part'
+    shutil.copyfile(paths[0], partial)
+    with h5py.File(partial, 'r+') as f:
+        for name in names:
+            group = f['tallies'][name]
+            group['results'][...] = totals[name]
+            group['n_realizations'][...] = realizations[name]
+        f['global_tallies'][...] = global_totals
+        f['n_realizations'][...] = n_total
+        f['k_combined'][...] = combine_keff(keff)
+    os.replace(partial, output)
+    return output
+
+
+def merge_runs(directories, output=MERGED):
+    """Merge the final statepoints of runs in `directories` into `output`."""
+    return merge_statepoints([sfr_post.final_statepoint(d) for d in directories], output)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        sys.exit("usage: python sfr_merge.py OUTPUT RUN_DIR RUN_DIR [RUN_DIR ...]")
+    print(merge_runs(sys.argv[2:], sys.argv[1]))
@@ -0,0 +1,130 @@
+import hashlib
+import os
+
+import openmc
+import openmc.mgxs
+
+import sfr_model
+import sfr_post
+
+##############################################
+           # Library Generation #
+##############################################
+
+GROUPS = 'ECCO-33'
+MGXS_DIR = 'mgxs'
+LIBRARY = 'mgxs.h5'
+MGXS_TYPES = ['total', 'absorption', 'nu-fission', 'fission', 'chi',
+              'nu-scatter matrix', 'multiplicity matrix']
+
+# Library entry for each material of the zone assemblies. The reflector steel
+# is collapsed with the outer assembly spectrum, the one closest to the
+# reflector rings among the infinite-lattice models.
+XSDATA_NAMES = {
+    'inner': {'metallic inner fuel': 'inner_fuel', 'stainless steel clad': 'clad',
+              'sodium coolant': 'sodium'},
+    'outer': {'metallic outer fuel': 'outer_fuel', 'stainless steel clad': 'reflector'},
+}
+
+
+def energy_groups(groups=GROUPS):
+    """Return the energy group structure used for the SFR libraries."""
+    return openmc.mgxs.EnergyGroups(openmc.mgxs.GROUP_STRUCTURES[groups])
+
+
+def zone_library(model, groups=GROUPS, legendre_order=3):
+    """Return an un-run material-wise MGXS library attached to `model`'s tallies."""
+    library = openmc.mgxs.Library(model.geometry)
+    library.energy_groups = energy_groups(groups)
+    library.mgxs_types = MGXS_TYPES
+    library.domain_type = 'material'
+    library.domains = list(model.materials)
+    library.by_nuclide = False
+    library.correction = None
+    library.scatter_format = 'legendre'
+    library.legendre_order = legendre_order
+    library.build_library()
+    library.add_to_tallies_file(model.tallies, merge=True)
+    return library
+
+
+def library_hash(path):
+    """Return a short hash of the contents of the library file `path`."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def generate_library(params=None, directory=MGXS_DIR, groups=GROUPS, threads=None,
+                     particles=10000, batches=60):
+    """Generate a multigroup library from the inner and outer zone assemblies.
+
+    Each zone assembly runs in continuous energy in ``directory/<zone>``; the
+    collapsed cross sections are written to ``directory/mgxs.h5`` and its
+    path is returned.
+    """
+    mg_library = openmc.MGXSLibrary(energy_groups(groups))
+    for zone, names in XSDATA_NAMES.items():
+        run_dir = os.path.join(directory, zone)
+        model = sfr_model.build_assembly_model(params, tallies=False, zone=zone)
+        model.settings.particles = particles
+        model.settings.batches = batches
+        library = zone_library(model, groups)
+
+        sfr_model.export_model(model, run_dir)
+        sfr_post.clear_statepoints(run_dir)
+        openmc.run(threads=threads, cwd=run_dir, output=False)
+
+        with openmc.StatePoint(sfr_post.final_statepoint(run_dir)) as sp:
+            library.load_from_statepoint(sp)
+        xsdata_names = [names.get(m.name, f'{zone}_{m.name}') for m in library.domains]
+        zone_xs = library.create_mg_library(xs_type='macro', xsdata_names=xsdata_names)
+        for xsdata in zone_xs.xsdatas:
+            if xsdata.name in names.values():
+                mg_library.add_xsdata(xsdata)
+
+    path = os.path.join(directory, LIBRARY)
+    mg_library.export_to_hdf5(path)
+    return path
+
+##############################################
+           # Multigroup Core Model #
+##############################################
+
+def _macroscopic(name, xsdata):
+    material = openmc.Material(name=name)
+    material.set_density('macro', 1.0)
+    material.add_macroscopic(xsdata)
+    return material
+
+
+def build_mg_core_model(params=None, library=os.path.join(MGXS_DIR, LIBRARY), loading=None):
+    """Return the full core model running in multigroup mode on `library`.
+
+    Every material is swapped for its macroscopic library entry; the
+    reflector pins get their own steel so reflector and clad can carry
+    different cross sections. `loading` is passed to
+    :func:`sfr_model.build_core_model`.
+    """
+    model = sfr_model.build_core_model(params, loading)
+
+    replacements = {
+        'metallic inner fuel': _macroscopic('metallic inner fuel', 'inner_fuel'),
+        'metallic outer fuel': _macroscopic('metallic outer fuel', 'outer_fuel'),
+        'stainless steel clad': _macroscopic('stainless steel clad', 'clad'),
+        'sodium coolant': _macroscopic('sodium coolant', 'sodium'),
+    }
+    reflector = _macroscopic('stainless steel reflector', 'reflector')
+    for cell in model.geometry.get_all_material_cells().values():
+        if cell.name == "stainless steel pincell":
+            cell.fill = reflector
+        else:
+            cell.fill = replacements[cell.fill.name]
+
+    model.materials = openmc.Materials(list(replacements.values()) + [reflector])
+    model.materials.cross_sections = os.path.abspath(library)
+    model.settings.energy_mode = 'multi-group'
+    model.settings.temperature = {'method': 'nearest', 'tolerance': 1000.0}
+    for plot in model.plots:
+        plot.colors = {**{replacements[m.name]: c for m, c in plot.colors.items()},
+                       reflector: 'gray'}
+    return model
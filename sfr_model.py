@@ -0,0 +1,682 @@
+import functools
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+
+import openmc
+import openmc.mgxs
+
+import sfr_lattice
+import sfr_plot
+
+##############################################
+                # Parameters #
+##############################################
+
+# One flat parameter set drives the pincell, assembly and full core models.
+# U238 is the balance of each fuel composition, so changing a Pu weight
+# fraction keeps the fuel at 100 wt%.
+
+DEFAULT_PARAMS = {
+    # fuel composition [wt%]
+    'inner_pu239_wo': 12.0,
+    'inner_pu241_wo': 3.0,
+    'outer_pu239_wo': 10.0,
+    'outer_pu241_wo': 2.0,
+    'pu238_wo': 0.3,
+    'pu240_wo': 4.0,
+    'pu242_wo': 0.7,
+    'zr_wo': 20.0,
+
+    # densities [g/cm3]
+    'fuel_density': 15.5,
+    'steel_density': 8.00,
+    'sodium_density': 0.87,
+
+    # pin dimensions [cm]
+    'inner_fuel_radius': 0.3000,
+    'inner_clad_inner_radius': 0.3075,
+    'inner_clad_outer_radius': 0.3575,
+    'outer_fuel_radius': 0.2980,
+    'outer_clad_inner_radius': 0.3050,
+    'outer_clad_outer_radius': 0.3550,
+    'reflector_pin_radius': 0.2980,
+    'pin_pitch': 0.85,
+
+    # assemblies
+    'assembly_rings': 6,
+    'assembly_edge': 5.1,
+    'inner_assembly_rings': 4,
+    'inner_assembly_edge': 8.0,
+    'outer_assembly_rings': 6,
+    'outer_assembly_edge': 12.2,
+    'reflector_assembly_rings': 4,
+    'reflector_assembly_edge': 8.0,
+
+    # core
+    'assembly_pitch': 14.085,
+    'core_inner_rings': 4,
+    'core_outer_rings': 3,
+    'core_reflector_rings': 4,
+    'core_height': 100.0,
+}
+
+MODEL_FILES = ('materials.xml', 'geometry.xml', 'settings.xml', 'tallies.xml', 'plots.xml')
+STAMP_FILE = '.sfr_model.json'
+
+
+def make_params(**overrides):
+    """Return the default parameter set with `overrides` applied."""
+    unknown = set(overrides) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise KeyError(f"Unknown SFR parameters: {sorted(unknown)}")
+    params = dict(DEFAULT_PARAMS)
+    params.update(overrides)
+    return params
+
+
+def ring_universes(universe, n_rings):
+    """Return HexLattice rings (outermost first) filled with one universe."""
+    return [[universe]*(6*r) for r in range(n_rings - 1, 0, -1)] + [[universe]]
+
+##############################################
+                # Materials #
+##############################################
+
+def metal_fuel(params, zone):
+    """Return the U-Pu-Zr fuel for the 'inner' or 'outer' enrichment zone."""
+    pu = {
+        'Pu238': params['pu238_wo'],
+        'Pu239': params[f'{zone}_pu239_wo'],
+        'Pu240': params['pu240_wo'],
+        'Pu241': params[f'{zone}_pu241_wo'],
+        'Pu242': params['pu242_wo'],
+    }
+    u238 = 100.0 - params['zr_wo'] - sum(pu.values())
+    if u238 < 0:
+        raise ValueError(f"{zone} fuel Pu and Zr weight fractions exceed 100 wt%")
+
+    fuel = openmc.Material(name=f"metallic {zone} fuel")
+    fuel.add_nuclide('U238', u238, percent_type='wo')
+    for nuclide, wo in pu.items():
+        fuel.add_nuclide(nuclide, wo, percent_type='wo')
+    fuel.add_element('Zr', params['zr_wo'], percent_type='wo')
+    fuel.set_density('g/cm3', params['fuel_density'])
+    return fuel
+
+
+def build_materials(params):
+    """Return a dict of the inner fuel, outer fuel, steel and sodium materials."""
+    steel = openmc.Material(name="stainless steel clad")
+    steel.add_element('C', 0.08, percent_type='wo')
+    steel.add_element('Si', 1.00, percent_type='wo')
+    steel.add_element('P', 0.045, percent_type='wo')
+    steel.add_element('S', 0.030, percent_type='wo')
+    steel.add_element('Mn', 2.00, percent_type='wo')
+    steel.add_element('Cr', 20.0, percent_type='wo')
+    steel.add_element('Ni', 11.0, percent_type='wo')
+    steel.add_element('Fe', 65.845, percent_type='wo')
+    steel.set_density('g/cm3', params['steel_density'])
+
+    sodium = openmc.Material(name="sodium coolant")
+    sodium.add_element('Na', 1.0)
+    sodium.set_density('g/cm3', params['sodium_density'])
+
+    return {
+        'inner_fuel': metal_fuel(params, 'inner'),
+        'outer_fuel': metal_fuel(params, 'outer'),
+        'steel': steel,
+        'sodium': sodium,
+    }
+
+##############################################
+                # Geometry #
+##############################################
+
+def pin_universe(params, zone, fuel, steel, sodium):
+    """Return the fuel/gap/clad/coolant pin universe for the `zone` pin dimensions."""
+    fuel_outer_radius = openmc.ZCylinder(r=params[f'{zone}_fuel_radius'])
+    clad_inner_radius = openmc.ZCylinder(r=params[f'{zone}_clad_inner_radius'])
+    clad_outer_radius = openmc.ZCylinder(r=params[f'{zone}_clad_outer_radius'])
+    coolant_outer = openmc.model.HexagonalPrism(edge_length=params['pin_pitch'])
+
+    fuel_cell = openmc.Cell(name=f"{zone} fuel cell", fill=fuel, region=-fuel_outer_radius)
+    gap = openmc.Cell(name="air gap", region=+fuel_outer_radius & -clad_inner_radius)
+    clad = openmc.Cell(name="steel clad", fill=steel, region=+clad_inner_radius & -clad_outer_radius)
+    coolant = openmc.Cell(name="sodium coolant", fill=sodium, region=+clad_outer_radius & -coolant_outer)
+
+    return openmc.Universe(name=f"{zone} pin", cells=[fuel_cell, gap, clad, coolant])
+
+
+def reflector_pin_universe(params, steel, sodium):
+    """Return the steel reflector pin universe."""
+    pin_radius = openmc.ZCylinder(r=params['reflector_pin_radius'])
+    coolant_outer = openmc.model.HexagonalPrism(edge_length=params['pin_pitch'])
+
+    reflector_pin = openmc.Cell(name="stainless steel pincell", fill=steel, region=-pin_radius)
+    reflector_coolant = openmc.Cell(name="reflector coolant", fill=sodium,
+                                    region=+pin_radius & -coolant_outer)
+
+    return openmc.Universe(name="reflector pin", cells=[reflector_pin, reflector_coolant])
+
+
+def coolant_universe(sodium):
+    """Return the all-sodium universe used outside every lattice."""
+    return openmc.Universe(name="coolant universe", cells=[openmc.Cell(fill=sodium)])
+
+
+def pin_lattice(params, universe, n_rings, outer, orientation='y', name=''):
+    """Return a hexagonal pin lattice of `n_rings` rings of one pin universe."""
+    lattice = openmc.HexLattice(name=name)
+    lattice.center = (0., 0.)
+    lattice.pitch = (params['pin_pitch'],)
+    lattice.orientation = orientation
+    lattice.outer = outer
+    lattice.universes = ring_universes(universe, n_rings)
+    return lattice
+
+
+def assembly_universe(lattice, edge_length, sodium, top, bottom, name=''):
+    """Return an assembly universe: the pin lattice inside a hex can, sodium outside."""
+    can = -openmc.model.HexagonalPrism(edge_length=edge_length)
+    main = openmc.Cell(fill=lattice, region=can & -top & +bottom)
+    outside = openmc.Cell(fill=sodium, region=~can & -top & +bottom)
+    return openmc.Universe(name=name, cells=[main, outside])
+
+
+def entropy_mesh(params, kind, n_rings=None):
+    """Return a Shannon entropy mesh covering the fissionable region of a model.
+
+    The core mesh has roughly one bin per assembly across the hex core of
+    `n_rings` rings (by default the parameters' ring counts); the pincell
+    and assembly meshes cover their radial boundary and, since those
+    models are infinite axially, a single tall axial bin.
+    """
+    mesh = openmc.RegularMesh(name='entropy')
+    if kind == 'core':
+        n_rings = n_rings or (params['core_inner_rings'] + params['core_outer_rings']
+                              + params['core_reflector_rings'])
+        half_width = (n_rings - 1)*params['assembly_pitch']
+        half_height = params['core_height']/2
+        n = 2*n_rings - 1
+    elif kind == 'assembly':
+        half_width, half_height = params['assembly_edge'], 1.0e4
+        n = 2*params['assembly_rings'] - 1
+    else:
+        half_width, half_height = params['pin_pitch'], 1.0e4
+        n = 4
+    mesh.lower_left = [-half_width, -half_width, -half_height]
+    mesh.upper_right = [half_width, half_width, half_height]
+    mesh.dimension = [n, n, 1]
+    return mesh
+
+
+def add_triggers(settings, tallies, keff_rel_err=5.0e-4, tally_rel_err=0.05,
+                 max_batches=200, interval=10):
+    """Stop the run once k-eff and every tally bin reach their relative-error targets.
+
+    ``settings.batches`` becomes the minimum batch count; after it, triggers
+    are checked every `interval` batches until `max_batches`.
+    """
+    settings.keff_trigger = {'type': 'rel_err', 'threshold': keff_rel_err}
+    for tally in tallies:
+        tally.triggers = [openmc.Trigger('rel_err', tally_rel_err)]
+    settings.trigger_active = True
+    settings.trigger_max_batches = max_batches
+    settings.trigger_batch_interval = interval
+
+
+def add_flux_3d_tally(model, params=None, dimension=(100, 100, 20), groups=None):
+    """Add an axially resolved 'flux 3d' mesh tally over the hex core to `model`.
+
+    `groups` is an optional group structure name from
+    ``openmc.mgxs.GROUP_STRUCTURES`` or a sequence of energy edges [eV].
+    """
+    params = make_params(**(params or {}))
+    half_height = params['core_height']/2
+
+    mesh = openmc.RegularMesh(name='flux 3d')
+    mesh.dimension = list(dimension)
+    mesh.lower_left = [-150, -150, -half_height]
+    mesh.upper_right = [150, 150, half_height]
+
+    tally = openmc.Tally(name='flux 3d')
+    tally.filters = [openmc.MeshFilter(mesh)]
+    if groups is not None:
+        if isinstance(groups, str):
+            groups = openmc.mgxs.GROUP_STRUCTURES[groups]
+        tally.filters.append(openmc.EnergyFilter(groups))
+    tally.scores = ['flux']
+    model.tallies.append(tally)
+    return tally
+
+##############################################
+                # Models #
+##############################################
+
+def _plot(filename, width, pixels, colors):
+    plot = openmc.Plot()
+    plot.filename = filename
+    plot.basis = 'xy'
+    plot.width = width
+    plot.pixels = pixels
+    plot.color_by = 'material'
+    plot.colors = colors
+    return openmc.Plots([plot])
+
+
+def _assembly_settings(params, kind):
+    settings = openmc.Settings()
+    settings.source = openmc.IndependentSource(space=openmc.stats.Point((0, 0, 0)))
+    settings.batches = 100
+    settings.inactive = 10
+    settings.particles = 1000
+    settings.output = {'tallies': True}
+    settings.run_mode = 'eigenvalue'
+    settings.entropy_mesh = entropy_mesh(params, kind)
+    return settings
+
+
+def build_pincell_model(params=None):
+    """Return a single inner-zone fuel pin in a reflective hexagonal cell."""
+    params = make_params(**(params or {}))
+    openmc.reset_auto_ids()
+
+    mats = build_materials(params)
+    pin = pin_universe(params, 'inner', mats['inner_fuel'], mats['steel'], mats['sodium'])
+
+    boundary = openmc.model.HexagonalPrism(edge_length=params['pin_pitch']/3**0.5,
+                                           orientation='x', boundary_type='reflective')
+    geometry = openmc.Geometry([openmc.Cell(fill=pin, region=-boundary)])
+
+    fuel_cell = geometry.get_cells_by_name("inner fuel cell")[0]
+    fuel_tally = openmc.Tally(name='fuel reactions')
+    fuel_tally.filters = [openmc.CellFilter(fuel_cell)]
+    fuel_tally.nuclides = ['U238']
+    fuel_tally.scores = ['total', 'fission', 'absorption', '(n,gamma)']
+
+    rr_tally = openmc.Tally(name='reaction rates')
+    rr_tally.scores = ['fission', 'absorption']
+
+    plots = _plot('sfr_pincell_plot', (2.0, 2.0), (200, 200), {
+        mats['inner_fuel']: 'green',
+        mats['steel']: 'gray',
+        mats['sodium']: 'blue',
+    })
+
+    return openmc.Model(
+        geometry=geometry,
+        materials=openmc.Materials([mats['inner_fuel'], mats['steel'], mats['sodium']]),
+        settings=_assembly_settings(params, 'pincell'),
+        tallies=openmc.Tallies([fuel_tally, rr_tally]),
+        plots=plots,
+    )
+
+
+def build_assembly_model(params=None, tallies=True, zone='inner'):
+    """Return the 61-pin assembly of SFR.py/SFR_pincell.py with reflective sides.
+
+    `zone` selects the 'inner' (default) or 'outer' fuel and pin dimensions.
+    """
+    params = make_params(**(params or {}))
+    openmc.reset_auto_ids()
+
+    mats = build_materials(params)
+    fuel = mats[f'{zone}_fuel']
+    pin = pin_universe(params, zone, fuel, mats['steel'], mats['sodium'])
+    lattice = pin_lattice(params, pin, params['assembly_rings'], coolant_universe(mats['sodium']))
+
+    outer_surface = openmc.model.HexagonalPrism(edge_length=params['assembly_edge'],
+                                                boundary_type='reflective')
+    geometry = openmc.Geometry([openmc.Cell(fill=lattice, region=-outer_surface)])
+
+    model_tallies = openmc.Tallies()
+    if tallies:
+        mesh = openmc.RegularMesh()
+        mesh.dimension = [50, 50, 1]
+        mesh.upper_right = [10, 10, 1]
+        mesh.lower_left = [-10, -10, -1]
+
+        fuel_cell = geometry.get_cells_by_name(f"{zone} fuel cell")[0]
+        fuel_tally = openmc.Tally(name='fuel reactions')
+        fuel_tally.filters = [openmc.CellFilter(fuel_cell)]
+        fuel_tally.nuclides = ['U238']
+        fuel_tally.scores = ['total', 'fission', 'absorption', '(n,gamma)']
+
+        flux_tally = openmc.Tally(name='flux')
+        flux_tally.filters = [openmc.MeshFilter(mesh)]
+        flux_tally.scores = ['flux']
+
+        rr_tally = openmc.Tally(name='reaction rates')
+        rr_tally.scores = ['fission', 'absorption']
+
+        model_tallies.extend([fuel_tally, flux_tally, rr_tally])
+
+    plots = _plot('hex_lattice_plot', (15.0, 15.0), (400, 400), {
+        fuel: 'green',
+        mats['steel']: 'gray',
+        mats['sodium']: 'blue',
+    })
+
+    return openmc.Model(
+        geometry=geometry,
+        materials=openmc.Materials([fuel, mats['steel'], mats['sodium']]),
+        settings=_assembly_settings(params, 'assembly'),
+        tallies=model_tallies,
+        plots=plots,
+    )
+
+
+def build_core_model(params=None, loading=None):
+    """Return the full hexagonal core of SFR_full_core.py.
+
+    `loading` is an sfr_lattice loading map (dict, text or file path) using
+    the symbols of ``sfr_lattice.CORE_SYMBOLS``; by default the inner, outer
+    and reflector zones fill whole rings as set by the parameters.
+    """
+    params = make_params(**(params or {}))
+    openmc.reset_auto_ids()
+
+    mats = build_materials(params)
+    steel, sodium = mats['steel'], mats['sodium']
+
+    half_height = params['core_height']/2
+    top = openmc.ZPlane(z0=+half_height, boundary_type='reflective')
+    bottom = openmc.ZPlane(z0=-half_height, boundary_type='reflective')
+
+    ########## Pin and Assembly Universes ##########
+
+    outer_universe = coolant_universe(sodium)
+    inner_pin = pin_universe(params, 'inner', mats['inner_fuel'], steel, sodium)
+    outer_pin = pin_universe(params, 'outer', mats['outer_fuel'], steel, sodium)
+    reflector_pin = reflector_pin_universe(params, steel, sodium)
+
+    inner_lattice = pin_lattice(params, inner_pin, params['inner_assembly_rings'],
+                                outer_universe, orientation='x', name='inner')
+    outer_lattice = pin_lattice(params, outer_pin, params['outer_assembly_rings'],
+                                outer_universe, orientation='x', name='outer')
+    reflector_lattice = pin_lattice(params, reflector_pin, params['reflector_assembly_rings'],
+                                    outer_universe, orientation='x', name='reflector')
+
+    main_inner_universe = assembly_universe(inner_lattice, params['inner_assembly_edge'],
+                                            sodium, top, bottom, name='inner assembly')
+    main_outer_universe = assembly_universe(outer_lattice, params['outer_assembly_edge'],
+                                            sodium, top, bottom, name='outer assembly')
+    reflector_pincell_universe = assembly_universe(reflector_lattice,
+                                                   params['reflector_assembly_edge'],
+                                                   sodium, top, bottom, name='reflector assembly')
+
+    ########## Core Lattice Definition ##########
+
+    loading = (sfr_lattice.core_loading(params) if loading is None
+               else sfr_lattice.as_loading_map(loading))
+    n_rings = loading['rings']
+    core_lattice = sfr_lattice.build_lattice(loading, {
+        'I': main_inner_universe,
+        'O': main_outer_universe,
+        'R': reflector_pincell_universe,
+    }, params['assembly_pitch'], outer=outer_universe, name='core')
+
+    core_prism = openmc.model.HexagonalPrism((n_rings - 1)*params['assembly_pitch'],
+                                             orientation=loading['orientation'],
+                                             boundary_type='reflective')
+    core_cell = openmc.Cell(fill=core_lattice, region=-core_prism & -top & +bottom)
+    geometry = openmc.Geometry(openmc.Universe(cells=[core_cell]))
+
+    ########## Settings ##########
+
+    bounds = [-50, -50, -half_height, 50, 50, half_height]
+    uniform_dist = openmc.stats.Box(bounds[:3], bounds[3:], only_fissionable=True)
+
+    settings = openmc.Settings()
+    settings.batches = 100
+    settings.inactive = 10
+    settings.particles = 20000
+    settings.source = openmc.IndependentSource(space=uniform_dist)
+    settings.run_mode = 'eigenvalue'
+    settings.temperature = {'method': 'interpolation'}
+    settings.entropy_mesh = entropy_mesh(params, 'core', n_rings)
+    settings.output = {'tallies': True}
+
+    ########## Tallies ##########
+
+    mesh = openmc.RegularMesh()
+    mesh.dimension = [100, 100, 1]
+    mesh.lower_left = [-150, -150, -half_height]
+    mesh.upper_right = [150, 150, half_height]
+
+    flux_tally = openmc.Tally(name='flux')
+    flux_tally.filters = [openmc.MeshFilter(mesh)]
+    flux_tally.scores = ['flux']
+
+    # The triggers watch the fission rate of every fuel assembly rather than
+    # the flux mesh, whose reflector and corner bins never reach the target.
+    assembly_tallies = []
+    loaded = {symbol for ring in sfr_lattice.ring_symbols(loading) for symbol in ring}
+    for symbol, universe in (('I', main_inner_universe), ('O', main_outer_universe)):
+        if symbol not in loaded:
+            continue
+        can_cell = next(c for c in universe.cells.values()
+                        if isinstance(c.fill, openmc.HexLattice))
+        tally = openmc.Tally(name=f'{universe.name} fission')
+        tally.filters = [openmc.DistribcellFilter(can_cell)]
+        tally.scores = ['fission']
+        assembly_tallies.append(tally)
+    add_triggers(settings, assembly_tallies)
+
+    plots = _plot('sfr_core_geometry', (350.0, 350.0), (1000, 1000), {
+        mats['inner_fuel']: 'red',
+        mats['outer_fuel']: 'orange',
+        steel: 'gray',
+        sodium: 'skyblue',
+    })
+
+    return openmc.Model(
+        geometry=geometry,
+        materials=openmc.Materials(list(mats.values())),
+        settings=settings,
+        tallies=openmc.Tallies([flux_tally] + assembly_tallies),
+        plots=plots,
+    )
+
+
+def sector_region(sector):
+    """Return the wedge region and boundary planes of a 60 or 30 degree core sector.
+
+    The 60 degree sector is closed by a rotationally periodic pair of planes;
+    the 30 degree sector uses the core's mirror planes with reflective
+    boundaries. Both wedges start at the +x axis.
+    """
+    if sector not in (60, 30):
+        raise ValueError(f"Unsupported core sector {sector}, expected 60 or 30")
+    angle = math.radians(sector)
+    boundary_type = 'periodic' if sector == 60 else 'reflective'
+    lower = openmc.YPlane(y0=0.0, boundary_type=boundary_type)
+    upper = openmc.Plane(a=-math.sin(angle), b=math.cos(angle), c=0.0, d=0.0,
+                         boundary_type=boundary_type)
+    if sector == 60:
+        lower.periodic_surface = upper
+    return +lower & -upper
+
+
+def build_sector_model(params=None, sector=60, loading=None):
+    """Return a 60 or 30 degree sector of the full core.
+
+    The core is 6-fold rotationally symmetric with mirror planes every 30
+    degrees, so a sector reproduces the full-core solution with
+    ``sector/360`` of the particles per batch. A `loading` map must keep
+    that symmetry.
+    """
+    if loading is not None:
+        loading = sfr_lattice.as_loading_map(loading)
+        if not sfr_lattice.sector_symmetric(loading, sector):
+            raise ValueError(f"Loading map is not symmetric enough for a {sector} degree sector")
+    model = build_core_model(params, loading)
+    params = make_params(**(params or {}))
+    half_height = params['core_height']/2
+
+    core_cell, = model.geometry.root_universe.cells.values()
+    core_cell.region = core_cell.region & sector_region(sector)
+
+    fuels = [m for m in model.materials if 'fuel' in m.name]
+    space = openmc.stats.CylindricalIndependent(
+        r=openmc.stats.PowerLaw(0.0, 50.0, 1.0),
+        phi=openmc.stats.Uniform(0.0, math.radians(sector)),
+        z=openmc.stats.Uniform(-half_height, half_height))
+    model.settings.source = openmc.IndependentSource(space=space, domains=fuels)
+    model.settings.particles = math.ceil(model.settings.particles*sector/360)
+    return model
+
+
+BUILDERS = {
+    'pincell': build_pincell_model,
+    'assembly': build_assembly_model,
+    'core': build_core_model,
+    'core60': functools.partial(build_sector_model, sector=60),
+    'core30': functools.partial(build_sector_model, sector=30),
+}
+
+
+def build_model(kind, params=None):
+    """Return the model of one of the ``BUILDERS`` kinds for a parameter set."""
+    try:
+        builder = BUILDERS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown SFR model kind '{kind}', expected one of {sorted(BUILDERS)}")
+    return builder(params)
+
+##############################################
+              # Export Cache #
+##############################################
+
+_SOURCE_HASH = hashlib.sha256()
+for _path in (__file__, sfr_lattice.__file__):
+    # Changing the builders or the lattice generator invalidates every cached request hash.
+    with open(_path, 'rb') as _f:
+        _SOURCE_HASH.update(_f.read())
+_SOURCE_HASH = _SOURCE_HASH.hexdigest()
+
+
+def _hash_files(directory):
+    digest = hashlib.sha256()
+    for name in MODEL_FILES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            digest.update(name.encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def read_stamp(directory='.'):
+    """Return the export stamp recorded in `directory`, or an empty dict."""
+    try:
+        with open(os.path.join(directory, STAMP_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_stamp(directory, stamp):
+    with open(os.path.join(directory, STAMP_FILE), 'w') as f:
+        json.dump(stamp, f, indent=2)
+
+
+def _plot_files(model):
+    return [f"{plot.filename}.png" for plot in (model.plots or [])]
+
+
+def model_hash(model):
+    """Return a SHA-256 of the XML that `model` exports to."""
+    with tempfile.TemporaryDirectory() as tmp:
+        model.export_to_xml(tmp)
+        return _hash_files(tmp)
+
+
+def export_model(model, directory='.', plot=False):
+    """Export `model` to `directory` unless identical XML is already there.
+
+    Returns ``(model_hash, exported)``. When `plot` is set, geometry plots
+    are written through the sfr_plot cache if the exported XML changed or a
+    PNG is missing; ``plot='background'`` renders them in a separate process
+    so a transport run can start meanwhile.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = read_stamp(directory)
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        model.export_to_xml(tmp)
+        digest = _hash_files(tmp)
+        exported = (stamp.get('model_hash') != digest or
+                    any(os.path.exists(os.path.join(tmp, name)) and
+                        not os.path.exists(os.path.join(directory, name))
+                        for name in MODEL_FILES))
+        if exported:
+            for name in MODEL_FILES:
+                target = os.path.join(directory, name)
+                if os.path.exists(target):
+                    os.remove(target)
+                if os.path.exists(os.path.join(tmp, name)):
+                    shutil.move(os.path.join(tmp, name), target)
+            stamp = {'model_hash': digest}
+
+    if plot and model.plots:
+        pngs = [os.path.join(directory, name) for name in _plot_files(model)]
+        if stamp.get('plot_hash') != digest or not all(map(os.path.exists, pngs)):
+            if plot == 'background':
+                sfr_plot.plot_model_async(model, directory)
+            else:
+                sfr_plot.plot_model(model, directory)
+        # A background job counts as done once submitted; a missing PNG
+        # (still rendering or failed) re-queues it on the next export.
+        stamp['plot_hash'] = digest
+        stamp['plot_files'] = _plot_files(model)
+
+    _write_stamp(directory, stamp)
+    return digest, exported
+
+
+def _request_hash(kind, params, settings):
+    try:
+        blob = json.dumps({'kind': kind, 'params': params, 'settings': settings or {},
+                           'source': _SOURCE_HASH}, sort_keys=True)
+    except TypeError:
+        return None
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def prepare_model(kind, params=None, directory='.', settings=None, plot=False):
+    """Build and export a model into `directory`, skipping work that is already done.
+
+    `settings` is a dict of :class:`openmc.Settings` attributes applied after
+    the model is built. When the same kind, parameters and settings were last
+    prepared in `directory`, the Python-side build is skipped entirely.
+    Returns ``(model_hash, exported)``.
+    """
+    params = make_params(**(params or {}))
+    request = _request_hash(kind, params, settings)
+
+    stamp = read_stamp(directory)
+    if request is not None and stamp.get('request_hash') == request:
+        present = all(os.path.exists(os.path.join(directory, name))
+                      for name in stamp.get('files', []))
+        plotted = not plot or (stamp.get('plot_hash') == stamp.get('model_hash') and
+                               all(os.path.exists(os.path.join(directory, name))
+                                   for name in stamp.get('plot_files', [])))
+        if present and plotted:
+            return stamp['model_hash'], False
+
+    model = build_model(kind, params)
+    for name, value in (settings or {}).items():
+        setattr(model.settings, name, value)
+    digest, exported = export_model(model, directory, plot=plot)
+
+    stamp = read_stamp(directory)
+    stamp['request_hash'] = request
+    stamp['files'] = [name for name in MODEL_FILES + tuple(_plot_files(model) if plot else ())
+                      if os.path.exists(os.path.join(directory, name))]
+    _write_stamp(directory, stamp)
+    return digest, exported
@@ -0,0 +1,230 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openmc
+
+import sfr_lattice
+import sfr_mgxs
+import sfr_model
+import sfr_pins
+import sfr_results
+import sfr_sweep
+
+##############################################
+         # Loading Pattern Evaluation #
+##############################################
+
+OPT_DIR = 'optimize'
+PATTERN_CACHE = 'patterns.json'
+
+# Screening runs are short and noisy, full runs resolve assembly powers to
+# about a percent. Triggers stay off so every candidate costs the same.
+FIDELITY_SETTINGS = {
+    'screen': {'particles': 2000, 'batches': 30, 'inactive': 10, 'trigger_active': False},
+    'mg': {'particles': 5000, 'batches': 40, 'inactive': 10, 'trigger_active': False},
+    'full': {'particles': 20000, 'batches': 100, 'inactive': 20, 'trigger_active': False},
+}
+
+
+def pattern_key(loading, overrides=None):
+    """Return a short hash identifying a loading map with its parameter overrides."""
+    blob = sfr_lattice.format_loading_map(loading) + json.dumps(overrides or {}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def assembly_peaking(pins):
+    """Return the max/mean fuel assembly power of a :func:`sfr_pins.pin_powers` result."""
+    assembly = np.concatenate([p['assembly'] for p in pins.values()])
+    power = np.concatenate([p['power'] for p in pins.values()])
+    totals = np.bincount(assembly, power)[np.unique(assembly)]
+    return float(totals.max()/totals.mean())
+
+
+def evaluate(loading, overrides=None, fidelity='screen', params=None, directory='.',
+             threads=None, library=None):
+    """Run one loading pattern at `fidelity` and return its k-eff and radial peaking.
+
+    Transport goes through the sfr_results index, so a model that was ever
+    run before is read back instead of simulated.
+    """
+    params = {**(params or {}), **(overrides or {})}
+    library_key = None
+    if fidelity == 'mg':
+        model = sfr_mgxs.build_mg_core_model(params, library, loading=loading)
+        library_key = sfr_mgxs.library_hash(library)
+    else:
+        model = sfr_model.build_core_model(params, loading)
+    # Fission rate stands in for power: kappa-fission is not in the MG library.
+    sfr_pins.add_pin_tallies(model, scores=('fission',))
+    for name, value in FIDELITY_SETTINGS[fidelity].items():
+        setattr(model.settings, name, value)
+
+    digest, _ = sfr_model.export_model(model, directory)
+    # The MG model XML only names the library file, so its contents join the key.
+    if library_key is not None:
+        digest += f'-{library_key}'
+    run_args = {'cwd': directory, 'output': False}
+    if threads:
+        run_args['threads'] = threads
+    result, cached = sfr_results.run_cached(digest, directory, run=lambda: openmc.run(**run_args),
+                                            metadata={'loading': pattern_key(loading, overrides),
+                                                      'fidelity': fidelity})
+    pins = sfr_pins.pin_powers('core', directory, params, score='fission', loading=loading)
+    return {
+        'key': pattern_key(loading, overrides),
+        'fidelity': fidelity,
+        'keff': result['keff'],
+        'keff_std': result['keff_std'],
+        'peaking': assembly_peaking(pins),
+        'library': library_key,
+        'cached': cached,
+    }
+
+##############################################
+          # Pattern Search #
+##############################################
+
+def fuel_slots(loading, zone_symbols=('I', 'O')):
+    """Return the (ring, position) slots of a symmetric loading map that hold fuel."""
+    return [(ring, pos) for ring, symbols in sorted(loading['map'].items()) if ring > 0
+            for pos, symbol in enumerate(symbols) if symbol in zone_symbols]
+
+
+def shuffle(loading, rng, swaps=1):
+    """Return a copy of `loading` with `swaps` pairs of unlike fuel assemblies exchanged."""
+    new = {**loading, 'map': {ring: list(symbols) for ring, symbols in loading['map'].items()}}
+    slots = fuel_slots(new)
+    for _ in range(swaps):
+        (r1, p1), (r2, p2) = rng.sample(slots, 2)
+        if new['map'][r1][p1] != new['map'][r2][p2]:
+            new['map'][r1][p1], new['map'][r2][p2] = new['map'][r2][p2], new['map'][r1][p1]
+    return new
+
+
+def objective(result, k_min=None):
+    """Return the value to minimize: radial peaking, penalized below `k_min`."""
+    penalty = 0.0 if k_min is None else 100.0*max(0.0, k_min - result['keff'])
+    return result['peaking'] + penalty
+
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _run_batch(candidates, fidelity, params, root, workers, cores, library, cache):
+    """Evaluate the candidates not yet in `cache` at `fidelity` in a process pool.
+
+    Multigroup results from a different library than `library` count as missing.
+    """
+    library_key = sfr_mgxs.library_hash(library) if fidelity == 'mg' else None
+
+    def missing(key):
+        entry = cache.get(key, {}).get(fidelity)
+        return entry is None or entry.get('library') != library_key
+
+    todo = {pattern_key(l, o): (l, o) for l, o in candidates if missing(pattern_key(l, o))}
+    if todo:
+        n_workers, threads = sfr_sweep.split_cores(len(todo), workers, cores)
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {key: pool.submit(evaluate, loading, overrides, fidelity, params,
+                                        os.path.join(root, fidelity, key), threads, library)
+                       for key, (loading, overrides) in todo.items()}
+            for key, future in futures.items():
+                loading, overrides = todo[key]
+                entry = cache.setdefault(key, {
+                    'loading': sfr_lattice.format_loading_map(loading),
+                    'overrides': overrides or {}})
+                entry[fidelity] = future.result()
+    return [cache[pattern_key(l, o)][fidelity] for l, o in candidates]
+
+
+def optimize(params=None, generations=5, candidates=24, finalists=3, screen='screen',
+             swaps=(1, 3), enrichments=None, k_min=None, seed=1, root=OPT_DIR,
+             workers=None, cores=None):
+    """Search shuffled core loadings for the flattest radial power.
+
+    Each generation mutates the best pattern found so far by swapping fuel
+    assemblies within 60 degree symmetric sectors (and, with `enrichments`,
+    picking an outer-zone Pu239 wt%), screens every candidate with short
+    'screen' or multigroup 'mg' runs, and sends only the `finalists` best
+    screened patterns to full continuous-energy runs. The multigroup library
+    is collapsed from the base parameters only, so 'mg' screening cannot
+    rank `enrichments`. Every evaluated pattern is kept in
+    ``root/patterns-<params>.json``, so no pattern is simulated twice at the
+    same fidelity. Returns the best pattern's cache entry.
+    """
+    if screen == 'mg' and enrichments:
+        raise ValueError("Multigroup screening cannot compare enrichments; use screen='screen'")
+    rng = random.Random(seed)
+    params = sfr_model.make_params(**(params or {}))
+    os.makedirs(root, exist_ok=True)
+    # Patterns are only comparable for the same base parameters.
+    params_key = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    cache_path = os.path.join(root, PATTERN_CACHE.replace('.json', f'-{params_key}.json'))
+    cache = _load_cache(cache_path)
+
+    library = None
+    if screen == 'mg':
+        library = os.path.abspath(os.path.join(sfr_mgxs.MGXS_DIR, sfr_mgxs.LIBRARY))
+        if not os.path.exists(library):
+            library = os.path.abspath(sfr_mgxs.generate_library(params))
+
+    best = (sfr_lattice.core_loading(params), {})
+    best_result, = _run_batch([best], 'full', params, root, workers, cores, library, cache)
+    print(f"Reference: peaking {best_result['peaking']:.3f}, k-eff {best_result['keff']:.5f}")
+
+    for generation in range(generations):
+        pool = []
+        for _ in range(candidates):
+            loading = shuffle(best[0], rng, rng.randint(*swaps))
+            overrides = dict(best[1])
+            if enrichments:
+                overrides['outer_pu239_wo'] = rng.choice(enrichments)
+            pool.append((loading, overrides))
+
+        screened = _run_batch(pool, screen, params, root, workers, cores, library, cache)
+        ranked = sorted(zip(pool, screened), key=lambda item: objective(item[1], k_min))
+        finalists_pool = [candidate for candidate, _ in ranked[:finalists]]
+        full = _run_batch(finalists_pool, 'full', params, root, workers, cores, library, cache)
+
+        for candidate, result in zip(finalists_pool, full):
+            if objective(result, k_min) < objective(best_result, k_min):
+                best, best_result = candidate, result
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f, indent=2)
+        print(f"Generation {generation}: best peaking {best_result['peaking']:.3f}, "
+              f"k-eff {best_result['keff']:.5f}")
+
+    with open(cache_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    return cache[pattern_key(*best)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Optimize the core loading for flat radial power.")
+    parser.add_argument('--generations', type=int, default=5)
+    parser.add_argument('--candidates', type=int, default=24)
+    parser.add_argument('--finalists', type=int, default=3)
+    parser.add_argument('--screen', choices=['screen', 'mg'], default='screen')
+    parser.add_argument('--enrichments', type=float, nargs='+')
+    parser.add_argument('--k-min', type=float)
+    parser.add_argument('--cores', type=int)
+    parser.add_argument('--output', default='optimized_loading.txt')
+    args = parser.parse_args()
+
+    best = optimize(generations=args.generations, candidates=args.candidates,
+                    finalists=args.finalists, screen=args.screen,
+                    enrichments=args.enrichments, k_min=args.k_min, cores=args.cores)
+    with open(args.output, 'w') as f:
+        f.write(best['loading'])
+    print(f"Best loading written to {args.output}: peaking {best['full']['peaking']:.3f}, "
+          f"overrides {best['overrides']}")
@@ -0,0 +1,165 @@
+import numpy as np
+import openmc
+
+import sfr_lattice
+import sfr_model
+import sfr_post
+
+##############################################
+           # Hex Lattice Geometry #
+##############################################
+
+def lattice_indices(n_rings):
+    """Return the (x, alpha) indices of a hex lattice in OpenMC's natural order.
+
+    This is the order OpenMC walks lattice elements when numbering
+    distributed cell instances: alpha in the outer loop, x in the inner loop.
+    """
+    r = np.arange(-n_rings + 1, n_rings)
+    a, x = np.meshgrid(r, r, indexing='ij')
+    a, x = a.ravel(), x.ravel()
+    valid = np.abs(x + a) < n_rings
+    return x[valid], a[valid]
+
+
+def hex_distance(x, a):
+    """Return the ring number (0 at the centre) of (x, alpha) lattice indices."""
+    return np.maximum(np.maximum(np.abs(x), np.abs(a)), np.abs(x + a))
+
+
+def lattice_centers(x, a, pitch, orientation='y', center=(0., 0.)):
+    """Return the (N, 2) element centres of (x, alpha) indices in a hex lattice."""
+    x, a = np.asarray(x, dtype=float), np.asarray(a, dtype=float)
+    if orientation == 'y':
+        cx, cy = np.sqrt(3.0)/2*x*pitch, (a + x/2)*pitch
+    else:
+        cx, cy = (x + a/2)*pitch, np.sqrt(3.0)/2*a*pitch
+    return np.column_stack([cx + center[0], cy + center[1]])
+
+
+def ring_positions(x, a, pitch, orientation='y'):
+    """Return the position of each element within its ring.
+
+    Positions follow HexLattice.universes: from the top going clockwise for
+    'y' lattices, and from the +x axis going clockwise for 'x' lattices.
+    The centre element is position 0 of ring 0.
+    """
+    centers = lattice_centers(x, a, pitch, orientation)
+    theta = np.arctan2(centers[:, 1], centers[:, 0])
+    if orientation == 'y':
+        key = np.mod(np.pi/2 - theta, 2*np.pi)
+    else:
+        key = np.mod(-theta, 2*np.pi)
+    key[key > 2*np.pi - 1e-9] = 0.0
+
+    ring = hex_distance(x, a)
+    order = np.lexsort((key, ring))
+    sorted_ring = ring[order]
+    first = np.searchsorted(sorted_ring, sorted_ring, side='left')
+    positions = np.empty_like(ring)
+    positions[order] = np.arange(ring.size) - first
+    return positions
+
+
+def hex_ring_coords(n_rings, pitch, orientation='y'):
+    """Return the (N, 2) pin centres of an `n_rings` hex lattice in natural order."""
+    return lattice_centers(*lattice_indices(n_rings), pitch, orientation)
+
+##############################################
+            # Distribcell Tallies #
+##############################################
+
+FUEL_ZONES = ('inner', 'outer')
+
+
+def add_pin_tallies(model, scores=('fission', 'kappa-fission')):
+    """Add a per-pin distribcell tally on every fuel cell of `model`.
+
+    Tallies are named '<zone> pin power' and returned in a dict by zone.
+    """
+    tallies = {}
+    for zone in FUEL_ZONES:
+        cells = model.geometry.get_cells_by_name(f"{zone} fuel cell")
+        if not cells:
+            continue
+        tally = openmc.Tally(name=f'{zone} pin power')
+        tally.filters = [openmc.DistribcellFilter(cells[0])]
+        tally.scores = list(scores)
+        model.tallies.append(tally)
+        tallies[zone] = tally
+    return tallies
+
+
+def pin_map(kind, zone='inner', params=None, loading=None):
+    """Return arrays mapping each distribcell instance of a zone's fuel cell to its pin.
+
+    The returned dict holds, per instance: 'assembly' (the assembly's index
+    in core natural order), 'assembly_ring'/'assembly_position', 'pin_ring'/
+    'pin_position' (rings counted from the centre) and global 'x'/'y'.
+    `loading` is the core's sfr_lattice loading map if it is not zoned by
+    whole rings from the parameters.
+    """
+    params = sfr_model.make_params(**(params or {}))
+    pin_pitch = params['pin_pitch']
+
+    if kind == 'assembly':
+        pin_rings, pin_orientation = params['assembly_rings'], 'y'
+        assemblies = np.array([0])
+        asm_ring = asm_pos = np.array([0])
+        asm_centers = np.zeros((1, 2))
+    else:
+        pin_rings, pin_orientation = params[f'{zone}_assembly_rings'], 'x'
+        loading = (sfr_lattice.core_loading(params) if loading is None
+                   else sfr_lattice.as_loading_map(loading))
+        core_orientation = loading['orientation']
+        cx, ca = lattice_indices(loading['rings'])
+        ring = hex_distance(cx, ca)
+        position = ring_positions(cx, ca, params['assembly_pitch'], core_orientation)
+        symbol = {name: s for s, name in sfr_lattice.CORE_SYMBOLS.items()}[zone]
+        assemblies = np.flatnonzero(sfr_lattice.symbols_at(loading, ring, position) == symbol)
+        asm_ring = ring[assemblies]
+        asm_pos = position[assemblies]
+        asm_centers = lattice_centers(cx[assemblies], ca[assemblies],
+                                      params['assembly_pitch'], core_orientation)
+
+    px, pa = lattice_indices(pin_rings)
+    n_pins = px.size
+    pin_centers = lattice_centers(px, pa, pin_pitch, pin_orientation)
+    centers = np.repeat(asm_centers, n_pins, axis=0) + np.tile(pin_centers, (assemblies.size, 1))
+
+    return {
+        'assembly': np.repeat(assemblies, n_pins),
+        'assembly_ring': np.repeat(asm_ring, n_pins),
+        'assembly_position': np.repeat(asm_pos, n_pins),
+        'pin_ring': np.tile(hex_distance(px, pa), assemblies.size),
+        'pin_position': np.tile(ring_positions(px, pa, pin_pitch, pin_orientation),
+                                assemblies.size),
+        'x': centers[:, 0],
+        'y': centers[:, 1],
+    }
+
+
+def pin_powers(kind, directory='.', params=None, score='kappa-fission', loading=None):
+    """Return the pin map of every fuel zone with its normalized pin power.
+
+    Powers are normalized to a mean of one over all fuel pins of the model
+    and stored under 'power' and 'power_std' in each zone's map.
+    """
+    maps = {}
+    with openmc.StatePoint(sfr_post.final_statepoint(directory)) as sp:
+        for zone in FUEL_ZONES:
+            try:
+                tally = sp.get_tally(name=f'{zone} pin power')
+            except LookupError:
+                continue
+            pins = pin_map(kind, zone, params, loading)
+            pins['power'] = tally.get_values(scores=[score]).ravel()
+            pins['power_std'] = tally.get_values(scores=[score], value='std_dev').ravel()
+            maps[zone] = pins
+
+    total = np.concatenate([pins['power'] for pins in maps.values()])
+    norm = total.mean() if total.size else 1.0
+    for pins in maps.values():
+        pins['power'] = pins['power']/norm
+        pins['power_std'] = pins['power_std']/norm
+    return maps
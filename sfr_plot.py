@@ -0,0 +1,95 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import openmc
+
+##############################################
+              # Plot Cache #
+##############################################
+
+PLOT_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'sfr_plots')
+
+
+def _plot_key(plot):
+    """Return the XML of a plot without the attributes that only name its output."""
+    element = plot.to_xml_element()
+    element.attrib.pop('id', None)
+    element.attrib.pop('filename', None)
+    for child in element.findall('filename'):
+        element.remove(child)
+    return ET.tostring(element)
+
+
+def plot_jobs(model):
+    """Return one ``(key, filename, xml_files)`` job per plot of `model`.
+
+    The key hashes the geometry and materials XML together with the plot's
+    basis, origin, width, pixels and colors; `xml_files` holds everything
+    needed to render the plot away from the model objects.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        model.geometry.export_to_xml(tmp)
+        model.materials.export_to_xml(tmp)
+        files = {}
+        for name in ('geometry.xml', 'materials.xml'):
+            with open(os.path.join(tmp, name), 'rb') as f:
+                files[name] = f.read()
+
+        jobs = []
+        for plot in model.plots or []:
+            openmc.Plots([plot]).export_to_xml(tmp)
+            with open(os.path.join(tmp, 'plots.xml'), 'rb') as f:
+                plot_files = {**files, 'plots.xml': f.read()}
+            digest = hashlib.sha256(files['geometry.xml'] + files['materials.xml']
+                                    + _plot_key(plot)).hexdigest()
+            jobs.append((digest, f"{plot.filename}.png", plot_files))
+    return jobs
+
+
+def render(job, directory='.', cache_dir=PLOT_CACHE):
+    """Produce one plot image in `directory`, rendering it only on a cache miss.
+
+    Returns True when the image came from the cache.
+    """
+    digest, filename, files = job
+    cached = os.path.join(cache_dir, f"{digest}.png")
+    hit = os.path.exists(cached)
+    if not hit:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, content in files.items():
+                with open(os.path.join(tmp, name), 'wb') as f:
+                    f.write(content)
+            openmc.plot_geometry(output=False, cwd=tmp)
+            partial = cached + f'.{os.getpid()}.part'
+            shutil.move(os.path.join(tmp, filename), partial)
+            os.replace(partial, cached)
+
+    os.makedirs(directory, exist_ok=True)
+    shutil.copyfile(cached, os.path.join(directory, filename))
+    return hit
+
+
+def plot_model(model, directory='.', cache_dir=PLOT_CACHE):
+    """Write every plot of `model` to `directory` through the plot cache."""
+    return [render(job, directory, cache_dir) for job in plot_jobs(model)]
+
+
+def _render_all(jobs, directory, cache_dir):
+    return [render(job, directory, cache_dir) for job in jobs]
+
+
+def plot_model_async(model, directory='.', cache_dir=PLOT_CACHE):
+    """Start :func:`plot_model` in a background process and return its Future.
+
+    The XML is generated up front, so the model can be changed or exported
+    for a transport run while the plots render.
+    """
+    executor = ProcessPoolExecutor(max_workers=1)
+    future = executor.submit(_render_all, plot_jobs(model), os.path.abspath(directory), cache_dir)
+    executor.shutdown(wait=False)
+    return future
@@ -0,0 +1,40 @@
+import glob
+import os
+
+import openmc
+
+
+def final_statepoint(directory='.'):
+    """Return the path of the highest-batch statepoint written in `directory`."""
+    paths = [path for path in glob.glob(os.path.join(directory, 'statepoint.*.h5'))
+             if os.path.basename(path).split('.')[1].isdigit()]
+    if not paths:
+        raise FileNotFoundError(f"No statepoint files found in '{directory}'")
+    return max(paths, key=lambda path: int(os.path.basename(path).split('.')[1]))
+
+
+def read_keff(directory='.'):
+    """Return the combined k-effective and its standard deviation from the final statepoint."""
+    with openmc.StatePoint(final_statepoint(directory)) as sp:
+        return sp.keff.nominal_value, sp.keff.std_dev
+
+
+def clear_statepoints(directory='.'):
+    """Remove statepoint and source files left in `directory` by an earlier run."""
+    for pattern in ('statepoint.*.h5', 'source.*.h5'):
+        for path in glob.glob(os.path.join(directory, pattern)):
+            os.remove(path)
+
+
+def read_mesh_tally(directory='.', tally_name='flux'):
+    """Return the mean, standard deviation and mesh of a mesh tally in the final statepoint.
+
+    The arrays are indexed ``[i, j, k]`` in mesh x, y, z order.
+    """
+    with openmc.StatePoint(final_statepoint(directory)) as sp:
+        tally = sp.get_tally(name=tally_name)
+        mesh = tally.find_filter(openmc.MeshFilter).mesh
+        shape = tuple(mesh.dimension)
+        mean = tally.mean.reshape(shape, order='F')
+        std = tally.std_dev.reshape(shape, order='F')
+    return mean, std, mesh
@@ -0,0 +1,334 @@
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import openmc
+import openmc.lib
+
+import sfr_lattice
+import sfr_model
+import sfr_pins
+
+##############################################
+          # Pre-Flight Geometry Check #
+##############################################
+
+PREFLIGHT_DIR = 'preflight'
+UNDEFINED = -1
+VOID = 0
+
+
+def expected_rings(kind, params=None, loading=None):
+    """Return the ring count each named lattice of a model kind should have.
+
+    With a `loading` map the core lattice has the map's ring count.
+    """
+    params = sfr_model.make_params(**(params or {}))
+    if kind in ('pincell',):
+        return {}
+    if kind == 'assembly':
+        return {'': params['assembly_rings']}
+    if loading is not None:
+        core_rings = sfr_lattice.as_loading_map(loading)['rings']
+    else:
+        core_rings = (params['core_inner_rings'] + params['core_outer_rings']
+                      + params['core_reflector_rings'])
+    return {
+        'inner': params['inner_assembly_rings'],
+        'outer': params['outer_assembly_rings'],
+        'reflector': params['reflector_assembly_rings'],
+        'core': core_rings,
+    }
+
+
+def check_lattice_rings(geometry, expected=None):
+    """Return a list of problems with the ring structure of every hex lattice.
+
+    Each ring must hold 6*r universes (one for the centre), no position may
+    be empty, and lattices named in `expected` must have that many rings.
+    """
+    issues = []
+    for lattice in geometry.get_all_lattices().values():
+        if not isinstance(lattice, openmc.HexLattice):
+            continue
+        label = f"lattice {lattice.id} '{lattice.name}'"
+        n_rings = lattice.num_rings
+        if expected and lattice.name in expected and n_rings != expected[lattice.name]:
+            issues.append(f"{label} has {n_rings} rings, expected {expected[lattice.name]}")
+        layers = lattice.universes if lattice.num_axial else [lattice.universes]
+        for k, layer in enumerate(layers):
+            for i, ring in enumerate(layer):
+                r = n_rings - 1 - i
+                size = 6*r if r else 1
+                where = f"{label} ring {r}" + (f" (axial level {k})" if lattice.num_axial else '')
+                if len(ring) != size:
+                    issues.append(f"{where} holds {len(ring)} universes, expected {size}")
+                empty = sum(u is None for u in ring)
+                if empty:
+                    issues.append(f"{where} has {empty} empty positions")
+        if lattice.outer is None:
+            issues.append(f"{label} has no outer universe")
+    return issues
+
+##############################################
+        # Vectorized Region Evaluation #
+##############################################
+
+def _evaluate(surface, xyz):
+    if hasattr(surface, 'get_Abc'):
+        A, b, c = surface.get_Abc()
+        return np.einsum('ni,ij,nj->n', xyz, A, xyz) + xyz @ b + c
+    return surface.evaluate(xyz.T)
+
+
+def inside(region, xyz):
+    """Return a boolean mask of the (N, 3) points `xyz` that lie in `region`."""
+    if region is None:
+        return np.ones(len(xyz), dtype=bool)
+    if isinstance(region, openmc.Halfspace):
+        value = _evaluate(region.surface, xyz)
+        return value >= 0. if region.side == '+' else value < 0.
+    if isinstance(region, openmc.Intersection):
+        return np.logical_and.reduce([inside(node, xyz) for node in region])
+    if isinstance(region, openmc.Union):
+        return np.logical_or.reduce([inside(node, xyz) for node in region])
+    if isinstance(region, openmc.Complement):
+        return ~inside(region.node, xyz)
+    raise TypeError(f"Unsupported region type {type(region).__name__}")
+
+
+def _cell_local(cell, xyz):
+    if cell.translation is not None:
+        xyz = xyz - np.asarray(cell.translation)
+    if cell.rotation is not None:
+        xyz = xyz @ np.asarray(cell.rotation_matrix).T
+    return xyz
+
+
+def _hex_elements(lattice, xyz):
+    """Return the (x, alpha) element of every point and its coordinates local to it."""
+    pitch = lattice.pitch[0]
+    center = np.asarray(lattice.center, dtype=float)
+    px, py = xyz[:, 0] - center[0], xyz[:, 1] - center[1]
+    if lattice.orientation == 'y':
+        x = px/(np.sqrt(3.0)/2*pitch)
+        a = py/pitch - x/2
+    else:
+        a = py/(np.sqrt(3.0)/2*pitch)
+        x = px/pitch - a/2
+
+    # Round the fractional cube coordinates to the nearest hex element.
+    s = -x - a
+    rx, ra, rs = np.rint(x), np.rint(a), np.rint(s)
+    dx, da, ds = np.abs(rx - x), np.abs(ra - a), np.abs(rs - s)
+    fix_x = (dx > da) & (dx > ds)
+    fix_a = ~fix_x & (da > ds)
+    rx[fix_x] = -ra[fix_x] - rs[fix_x]
+    ra[fix_a] = -rx[fix_a] - rs[fix_a]
+    ix, ia = rx.astype(int), ra.astype(int)
+
+    local = xyz.copy()
+    local[:, :2] -= sfr_pins.lattice_centers(ix, ia, pitch, lattice.orientation, center[:2])
+    return ix, ia, local
+
+
+def _descend(universe, xyz, index, overlaps, examples, points):
+    masks = [(cell, inside(cell.region, xyz)) for cell in universe.cells.values()]
+    count = np.sum([mask for _, mask in masks], axis=0)
+
+    for i in np.flatnonzero(count > 1):
+        key = tuple(sorted(f"{cell.id} '{cell.name}'" for cell, mask in masks if mask[i]))
+        overlaps[key] += 1
+        examples.setdefault(key, points[index[i]].tolist())
+
+    for cell, mask in masks:
+        selected = mask & (count == 1)
+        if not selected.any():
+            continue
+        local = _cell_local(cell, xyz[selected])
+        if isinstance(cell.fill, openmc.Universe):
+            _descend(cell.fill, local, index[selected], overlaps, examples, points)
+        elif isinstance(cell.fill, openmc.Lattice):
+            _descend_lattice(cell.fill, local, index[selected], overlaps, examples, points)
+
+
+def _axial_elements(z, z0, pitch, n):
+    """Return the axial index of every height `z` in a stack of `n` levels from `z0`."""
+    iz = np.floor((z - z0)/pitch).astype(int)
+    return iz, z - (z0 + (iz + 0.5)*pitch), (iz < 0) | (iz >= n)
+
+
+def _lattice_elements(lattice, xyz):
+    """Return the element indices of every point, its local coordinates and an outside mask."""
+    if isinstance(lattice, openmc.HexLattice):
+        ix, ia, local = _hex_elements(lattice, xyz)
+        outside = sfr_pins.hex_distance(ix, ia) >= lattice.num_rings
+        columns = [ix, ia]
+        if lattice.num_axial:
+            pitch_z = lattice.pitch[1]
+            z0 = lattice.center[2] - lattice.num_axial*pitch_z/2
+            iz, local[:, 2], out_z = _axial_elements(xyz[:, 2], z0, pitch_z, lattice.num_axial)
+            columns.append(iz)
+            outside |= out_z
+        return np.column_stack(columns), local, outside
+
+    # Rectangular lattice, 2D or 3D
+    n_dim = len(lattice.pitch)
+    lower_left = np.asarray(lattice.lower_left, dtype=float)
+    pitch = np.asarray(lattice.pitch, dtype=float)
+    dimension = np.asarray(lattice.shape, dtype=int)
+    local = xyz.copy()
+    elements = np.floor((xyz[:, :n_dim] - lower_left)/pitch).astype(int)
+    local[:, :n_dim] -= lower_left + (elements + 0.5)*pitch
+    outside = np.any((elements < 0) | (elements >= dimension), axis=1)
+    return elements, local, outside
+
+
+def _descend_lattice(lattice, xyz, index, overlaps, examples, points):
+    elements, local, outside = _lattice_elements(lattice, xyz)
+    if lattice.outer is not None and outside.any():
+        _descend(lattice.outer, xyz[outside], index[outside], overlaps, examples, points)
+
+    elements = elements[~outside]
+    local, index = local[~outside], index[~outside]
+    unique, groups = np.unique(elements, axis=0, return_inverse=True)
+    for g, element in enumerate(unique):
+        members = groups.ravel() == g
+        universe = lattice.get_universe(tuple(int(i) for i in element))
+        if universe is not None:
+            _descend(universe, local[members], index[members], overlaps, examples, points)
+
+
+def find_overlaps(geometry, points, batch_size=20000):
+    """Return the overlapping cell sets found at `points` as ``[(cells, count, example)]``.
+
+    Every cell region at every level of the geometry is evaluated on whole
+    batches of points with numpy, so a point inside more than one cell of a
+    universe is caught even though OpenMC's own lookup would stop at the
+    first match.
+    """
+    overlaps, examples = Counter(), {}
+    root = geometry.root_universe
+    for start in range(0, len(points), batch_size):
+        batch = points[start:start + batch_size]
+        _descend(root, batch, np.arange(start, start + len(batch)), overlaps, examples, points)
+    return [(list(key), n, examples[key]) for key, n in overlaps.most_common()]
+
+##############################################
+              # Point Sampling #
+##############################################
+
+def geometry_bounds(geometry):
+    """Return finite lower-left and upper-right corners around the root universe.
+
+    Hexagonal prisms built from oblique planes are unbounded along one
+    horizontal axis; that axis takes the hexagon's corner-to-corner width.
+    """
+    lower, upper = (np.array(v, dtype=float) for v in geometry.bounding_box)
+    for axis, other in ((0, 1), (1, 0)):
+        if not (np.isfinite(lower[axis]) and np.isfinite(upper[axis])):
+            half = (upper[other] - lower[other])/np.sqrt(3.0)
+            lower[axis], upper[axis] = -half, half
+    if not np.all(np.isfinite(np.concatenate([lower, upper]))):
+        raise ValueError("Geometry is unbounded; pass explicit bounds")
+    return lower, upper
+
+
+def sample_points(geometry, n_points, bounds=None, seed=1):
+    """Return `n_points` uniform points inside the root universe and the volume they cover."""
+    lower, upper = bounds if bounds is not None else geometry_bounds(geometry)
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    rng = np.random.default_rng(seed)
+    regions = [cell.region for cell in geometry.root_universe.cells.values()]
+
+    points, drawn = [], 0
+    while sum(len(p) for p in points) < n_points:
+        candidates = lower + (upper - lower)*rng.random((n_points, 3))
+        drawn += n_points
+        keep = np.logical_or.reduce([inside(region, candidates) for region in regions])
+        points.append(candidates[keep])
+    points = np.concatenate(points)
+    accepted = len(points)/drawn
+    return points[:n_points], np.prod(upper - lower)*accepted
+
+
+def sample_materials(directory, points, batch_size=20000):
+    """Return the material ID OpenMC finds at every point of a model exported to `directory`.
+
+    Points in void cells get VOID and points outside every cell UNDEFINED.
+    The model is loaded in plot mode, so no cross sections are read.
+    """
+    cwd = os.getcwd()
+    os.chdir(directory)
+    args = ['--plot'] if os.path.exists('plots.xml') else None
+    openmc.lib.init(args=args, output=False)
+    try:
+        material_ids = np.empty(len(points), dtype=int)
+        for start in range(0, len(points), batch_size):
+            for i, xyz in enumerate(points[start:start + batch_size], start):
+                try:
+                    material = openmc.lib.find_material(xyz)
+                except openmc.exceptions.GeometryError:
+                    material_ids[i] = UNDEFINED
+                else:
+                    material_ids[i] = VOID if material is None else material.id
+    finally:
+        openmc.lib.finalize()
+        os.chdir(cwd)
+    return material_ids
+
+
+def preflight(model, directory=PREFLIGHT_DIR, n_points=100000, expected=None, bounds=None,
+              seed=1, batch_size=20000):
+    """Check a model's geometry before transport and return a report.
+
+    The report lists lattice ring problems, overlapping cells, the points
+    where OpenMC finds no cell, and the volume and volume fraction of every
+    material estimated from the sampled points.
+    """
+    start = time.perf_counter()
+    ring_issues = check_lattice_rings(model.geometry, expected)
+    points, volume = sample_points(model.geometry, n_points, bounds, seed)
+    overlaps = find_overlaps(model.geometry, points, batch_size)
+
+    sfr_model.export_model(model, directory)
+    material_ids = sample_materials(directory, points, batch_size)
+
+    names = {m.id: m.name for m in model.materials}
+    names[VOID] = 'void'
+    counts = Counter(material_ids[material_ids != UNDEFINED].tolist())
+    fractions = {names.get(i, str(i)): n/len(points) for i, n in sorted(counts.items())}
+    undefined = points[material_ids == UNDEFINED]
+
+    return {
+        'points': len(points),
+        'volume': volume,
+        'lattice_issues': ring_issues,
+        'overlaps': [{'cells': cells, 'points': n, 'example': example}
+                     for cells, n, example in overlaps],
+        'undefined': {'points': len(undefined), 'examples': undefined[:10].tolist()},
+        'volume_fractions': fractions,
+        'volumes': {name: f*volume for name, f in fractions.items()},
+        'ok': not (ring_issues or overlaps or len(undefined)),
+        'time': time.perf_counter() - start,
+    }
+
+
+def check(kind, params=None, **kwargs):
+    """Build the model `kind` and run :func:`preflight` on it."""
+    model = sfr_model.build_model(kind, params)
+    kwargs.setdefault('directory', os.path.join(PREFLIGHT_DIR, kind))
+    return preflight(model, expected=expected_rings(kind, params), **kwargs)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in sfr_model.BUILDERS:
+        sys.exit(f"usage: python sfr_preflight.py {{{','.join(sorted(sfr_model.BUILDERS))}}} "
+                 "[N_POINTS]")
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    report = check(sys.argv[1], n_points=n)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['ok'] else 1)
@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import h5py
+import numpy as np
+
+import sfr_post
+
+##############################################
+           # Runtime Profiling #
+##############################################
+
+# Statepoint runtime entries reported as phases, in the order OpenMC prints them.
+PHASES = ('total initialization', 'reading cross sections', 'simulation',
+          'transport', 'inactive batches', 'active batches', 'synchronizing fission bank',
+          'sampling source sites', 'SEND-RECV source sites', 'accumulating tallies',
+          'writing statepoints', 'total')
+
+# Fraction of active batch time above which tallies are flagged as dominating.
+TALLY_OVERHEAD_LIMIT = 0.5
+# Fraction of active batch time spent in trigger-extended batches that is flagged.
+TRIGGER_LIMIT = 0.5
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _read_tallies(f):
+    """Return name, filter types and bin count of every tally in an open statepoint."""
+    tallies = []
+    if 'tallies' not in f:
+        return tallies
+    group = f['tallies']
+    for key in group:
+        if not key.startswith('tally '):
+            continue
+        tally = group[key]
+        filter_ids = tally['filters'][()] if 'filters' in tally else []
+        types = [_decode(group['filters'][f'filter {i}']['type'][()])
+                 for i in np.atleast_1d(filter_ids)]
+        tallies.append({
+            'name': _decode(tally['name'][()]),
+            'filters': types,
+            'bins': int(np.prod(tally['results'].shape[:2])),
+            'mesh': 'mesh' in types,
+        })
+    return tallies
+
+
+def _xml_triggers(directory):
+    """Return whether triggers are active in settings.xml and which tallies carry one."""
+    active, tallies = False, []
+    try:
+        settings = ET.parse(os.path.join(directory, 'settings.xml')).getroot()
+        active = (settings.findtext('trigger/active') or '').strip().lower() == 'true'
+        root = ET.parse(os.path.join(directory, 'tallies.xml')).getroot()
+        tallies = [t.get('name') or t.get('id') for t in root.iter('tally')
+                   if t.find('trigger') is not None]
+    except (OSError, ET.ParseError):
+        pass
+    return active, tallies
+
+
+def profile(statepoint):
+    """Return a structured runtime report for one statepoint.
+
+    Phase times come straight from the statepoint's runtime group. The tally
+    overhead is estimated as the drop from the inactive to the active
+    particle rate, since tallies are only scored in active batches. Trigger
+    information is read from the settings.xml and tallies.xml next to the
+    statepoint when they are present.
+    """
+    with h5py.File(statepoint, 'r') as f:
+        runtime = {name: float(f['runtime'][name][()]) for name in f['runtime']}
+        n_particles = int(f['n_particles'][()])
+        n_batches = int(f['n_batches'][()])
+        n_inactive = int(f['n_inactive'][()]) if 'n_inactive' in f else 0
+        current_batch = int(f['current_batch'][()])
+        tallies = _read_tallies(f)
+
+    total = runtime.get('total', sum(runtime.get(p, 0.0) for p in
+                                     ('total initialization', 'simulation')))
+    n_active = current_batch - n_inactive
+    t_inactive = runtime.get('inactive batches', 0.0)
+    t_active = runtime.get('active batches', 0.0)
+    inactive_rate = n_inactive*n_particles/t_inactive if t_inactive > 0 else None
+    active_rate = n_active*n_particles/t_active if t_active > 0 else None
+    overhead = (max(0.0, 1 - active_rate/inactive_rate)
+                if inactive_rate and active_rate else None)
+
+    trigger_active, trigger_tallies = _xml_triggers(os.path.dirname(os.path.abspath(statepoint)))
+    extra_batches = max(0, current_batch - n_batches)
+    trigger_fraction = extra_batches/n_active if n_active > 0 else 0.0
+
+    phases = {name: {'time': runtime[name], 'fraction': runtime[name]/total if total else None}
+              for name in PHASES if name in runtime}
+    phases.update({name: {'time': value, 'fraction': value/total if total else None}
+                   for name, value in runtime.items() if name not in phases})
+
+    mesh_bins = sum(t['bins'] for t in tallies if t['mesh'])
+    flags = []
+    if overhead is not None and overhead > TALLY_OVERHEAD_LIMIT:
+        if mesh_bins:
+            flags.append(f"mesh tallies dominate: {100*overhead:.0f}% of active batch time "
+                         f"goes to tallies with {mesh_bins} mesh bins")
+        else:
+            flags.append(f"tallies dominate: {100*overhead:.0f}% of active batch time")
+    if trigger_fraction > TRIGGER_LIMIT:
+        flags.append(f"tally triggers dominate: {extra_batches} of {n_active} active batches "
+                     f"were added by triggers ({', '.join(map(str, trigger_tallies)) or 'k-eff'})")
+    if total and runtime.get('total initialization', 0.0)/total > 0.5:
+        flags.append("initialization takes more than half of the run")
+
+    return {
+        'statepoint': statepoint,
+        'particles': n_particles,
+        'batches': {'requested': n_batches, 'run': current_batch, 'inactive': n_inactive,
+                    'active': n_active, 'added_by_triggers': extra_batches},
+        'phases': phases,
+        'inactive_rate': inactive_rate,
+        'active_rate': active_rate,
+        'tally_overhead': overhead,
+        'tallies': tallies,
+        'mesh_bins': mesh_bins,
+        'triggers': {'active': trigger_active, 'tallies': trigger_tallies,
+                     'fraction': trigger_fraction},
+        'flags': flags,
+    }
+
+
+def profile_run(directory='.'):
+    """Return the runtime report for the final statepoint in `directory`."""
+    return profile(sfr_post.final_statepoint(directory))
+
+
+def format_report(report):
+    """Return a report as human-readable text."""
+    batches = report['batches']
+    lines = [f"{report['statepoint']}: {report['particles']} particles, "
+             f"{batches['run']} batches ({batches['inactive']} inactive)"]
+    for name, phase in report['phases'].items():
+        fraction = '' if phase['fraction'] is None else f" {100*phase['fraction']:5.1f}%"
+        lines.append(f"  {name:28s} {phase['time']:10.3f} s{fraction}")
+    for label, key in (('inactive', 'inactive_rate'), ('active', 'active_rate')):
+        if report[key]:
+            lines.append(f"  {label} rate: {report[key]:.0f} particles/s")
+    if report['tally_overhead'] is not None:
+        lines.append(f"  tally overhead: {100*report['tally_overhead']:.1f}% of active batch time")
+    lines += [f"  WARNING: {flag}" for flag in report['flags']]
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit("usage: python sfr_profile.py RUN_DIR_OR_STATEPOINT [--json]")
+    target = sys.argv[1]
+    report = profile(target) if os.path.isfile(target) else profile_run(target)
+    print(json.dumps(report, indent=2) if '--json' in sys.argv else format_report(report))
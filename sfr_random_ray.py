@@ -0,0 +1,121 @@
+import json
+import os
+
+import numpy as np
+import openmc
+
+import sfr_mgxs
+import sfr_model
+import sfr_post
+
+##############################################
+            # Random Ray Model #
+##############################################
+
+RR_DIR = 'random_ray'
+
+
+def source_region_mesh(tally_mesh):
+    """Return a mesh with the bins of `tally_mesh` that subdivides random ray source regions."""
+    mesh = openmc.RegularMesh(name='source regions')
+    mesh.lower_left = list(tally_mesh.lower_left)
+    mesh.upper_right = list(tally_mesh.upper_right)
+    mesh.dimension = list(tally_mesh.dimension)
+    return mesh
+
+
+def build_random_ray_model(params=None, library=os.path.join(sfr_mgxs.MGXS_DIR, sfr_mgxs.LIBRARY),
+                           rays=2000, batches=200, inactive=100,
+                           distance_inactive=100.0, distance_active=500.0):
+    """Return the multigroup full core solved with the random ray method.
+
+    Source regions are the model's cells subdivided by a regular mesh with
+    the bins of the 100x100 flux mesh tally, which is the same tally as the
+    Monte Carlo model's, so the two maps compare bin for bin.
+    """
+    params = sfr_model.make_params(**(params or {}))
+    model = sfr_mgxs.build_mg_core_model(params, library)
+    half_height = params['core_height']/2
+
+    flux_tally = next(t for t in model.tallies if t.name == 'flux')
+    mesh = source_region_mesh(flux_tally.filters[0].mesh)
+    # Rays start inside the hex core, which the entropy mesh just covers.
+    core = sfr_model.entropy_mesh(params, 'core')
+    lower_left = list(core.lower_left[:2]) + [-half_height]
+    upper_right = list(core.upper_right[:2]) + [half_height]
+    ray_source = openmc.IndependentSource(space=openmc.stats.Box(lower_left, upper_right),
+                                          angle=openmc.stats.Isotropic())
+
+    settings = model.settings
+    settings.particles = rays
+    settings.batches = batches
+    settings.inactive = inactive
+    settings.random_ray = {
+        'distance_inactive': distance_inactive,
+        'distance_active': distance_active,
+        'ray_source': ray_source,
+        'source_region_meshes': [(mesh, [model.geometry.root_universe])],
+    }
+    settings.trigger_active = False
+    # Random ray tallies cannot use distribcell filters, so only the flux map is kept.
+    model.tallies = openmc.Tallies([flux_tally])
+    flux_tally.triggers = []
+    return model
+
+
+def run_random_ray(params=None, directory=RR_DIR, threads=None, **kwargs):
+    """Export and run the random ray core in `directory` and return its k-eff."""
+    model = build_random_ray_model(params, **kwargs)
+    sfr_model.export_model(model, directory)
+    sfr_post.clear_statepoints(directory)
+    openmc.run(threads=threads, cwd=directory, output=False)
+    return sfr_post.read_keff(directory)
+
+##############################################
+           # Comparison Report #
+##############################################
+
+def _runtime(directory):
+    with openmc.StatePoint(sfr_post.final_statepoint(directory)) as sp:
+        return sp.runtime['total']
+
+
+def compare(mc_directory, rr_directory=RR_DIR, tally_name='flux', threshold=0.01,
+            report='random_ray_comparison.json'):
+    """Compare a random ray run against a continuous-energy Monte Carlo run.
+
+    Both flux maps are normalized to their sum over the bins where the Monte
+    Carlo flux exceeds `threshold` of its maximum; differences are reported
+    over those bins only. The report is written as JSON to
+    ``rr_directory/report`` and returned.
+    """
+    mc, mc_std, _ = sfr_post.read_mesh_tally(mc_directory, tally_name)
+    rr, _, _ = sfr_post.read_mesh_tally(rr_directory, tally_name)
+    mc, rr = mc.sum(axis=2), rr.sum(axis=2)
+    mc_std = np.sqrt((mc_std**2).sum(axis=2))
+
+    mask = mc > threshold*mc.max()
+    mc_norm = mc/mc[mask].sum()
+    rr_norm = rr/rr[mask].sum()
+    diff = (rr_norm[mask] - mc_norm[mask])/mc_norm[mask]
+    mc_rel = mc_std[mask]/mc[mask]
+
+    mc_k, mc_k_std = sfr_post.read_keff(mc_directory)
+    rr_k, rr_k_std = sfr_post.read_keff(rr_directory)
+    mc_time, rr_time = _runtime(mc_directory), _runtime(rr_directory)
+
+    result = {
+        'keff_mc': [mc_k, mc_k_std],
+        'keff_random_ray': [rr_k, rr_k_std],
+        'keff_difference_pcm': 1e5*(rr_k - mc_k),
+        'flux_bins_compared': int(mask.sum()),
+        'flux_rms_rel_diff': float(np.sqrt(np.mean(diff**2))),
+        'flux_max_abs_rel_diff': float(np.abs(diff).max()),
+        'flux_mc_mean_rel_err': float(mc_rel.mean()),
+        'runtime_mc': mc_time,
+        'runtime_random_ray': rr_time,
+        'speedup': mc_time/rr_time if rr_time else None,
+    }
+    with open(os.path.join(rr_directory, report), 'w') as f:
+        json.dump(result, f, indent=2)
+    return result
@@ -0,0 +1,168 @@
+import h5py
+import numpy as np
+
+##############################################
+          # Lazy Statepoint Reader #
+##############################################
+
+VALUES = ('sum', 'sum_sq', 'mean', 'std_dev', 'rel_err')
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class TallyReader:
+    """Read slices of one tally straight from a statepoint without loading it whole.
+
+    The tally results are exposed as a virtual array with one axis per filter
+    dimension, in storage order. A mesh filter contributes 'z', 'y' and 'x'
+    axes (x varies fastest in OpenMC), an energy filter a 'group' axis
+    (group 0 is the lowest energy) and any other filter one axis named after
+    its type. When the results dataset is stored contiguously it is
+    memory-mapped, so slicing only touches the pages it needs; otherwise the
+    selected rows are read from HDF5 in chunks.
+
+    Use as a context manager::
+
+        with TallyReader('statepoint.100.h5', 'flux') as flux:
+            plane = flux.read(z=0)            # indexed [x, y]
+            groups = flux.read(z=3, group=0)
+    """
+
+    def __init__(self, path, name, chunk_rows=1 << 20):
+        self.path = path
+        self.name = name
+        self.chunk_rows = chunk_rows
+        self._file = h5py.File(path, 'r')
+        tallies = self._file['tallies']
+
+        for key in tallies:
+            if key.startswith('tally ') and _decode(tallies[key]['name'][()]) == name:
+                self._group = tallies[key]
+                break
+        else:
+            self._file.close()
+            raise LookupError(f"No tally named '{name}' in '{path}'")
+
+        group = self._group
+        self.n_realizations = int(group['n_realizations'][()])
+        self.scores = [_decode(s) for s in group['score_bins'][()]]
+        self.nuclides = [_decode(n) for n in group['nuclides'][()]]
+
+        self.axes, self.shape = [], []
+        self.meshes, self.energy_bins = {}, None
+        filter_ids = group['filters'][()] if 'filters' in group else []
+        for filter_id in np.atleast_1d(filter_ids):
+            filt = tallies['filters'][f'filter {filter_id}']
+            filter_type = _decode(filt['type'][()])
+            if filter_type == 'mesh':
+                mesh = tallies['meshes'][f"mesh {int(np.atleast_1d(filt['bins'][()])[0])}"]
+                dimension = list(mesh['dimension'][()]) + [1]*(3 - len(mesh['dimension'][()]))
+                self.meshes[filter_id] = {k: mesh[k][()] for k in ('dimension', 'lower_left',
+                                                                    'upper_right')}
+                self.axes += ['z', 'y', 'x']
+                self.shape += [int(n) for n in dimension[::-1]]
+            elif filter_type == 'energy':
+                self.energy_bins = filt['bins'][()]
+                self.axes.append('group')
+                self.shape.append(int(filt['n_bins'][()]))
+            else:
+                self.axes.append(filter_type)
+                self.shape.append(int(filt['n_bins'][()]))
+
+        self._results = group['results']
+        self.n_filter_bins, self.n_score_bins = self._results.shape[:2]
+        self._memmap = self._map_results()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the underlying HDF5 file."""
+        self._memmap = None
+        self._file.close()
+
+    def _map_results(self):
+        offset = self._results.id.get_offset()
+        if offset is None or self._results.chunks is not None:
+            return None
+        data = np.memmap(self.path, dtype=self._results.dtype, mode='r',
+                         offset=offset, shape=self._results.shape)
+        return data.reshape(tuple(self.shape) + data.shape[1:])
+
+    def _score_index(self, score, nuclide):
+        score = score or self.scores[0]
+        nuclide = nuclide or self.nuclides[0]
+        return self.nuclides.index(nuclide)*len(self.scores) + self.scores.index(score)
+
+    def _rows(self, selection):
+        index = [np.arange(n)[selection.get(axis, slice(None))]
+                 for axis, n in zip(self.axes, self.shape)]
+        out_shape = tuple(np.size(i) for i in index if np.ndim(i) > 0)
+        grids = np.ix_(*[np.atleast_1d(i) for i in index])
+        return np.ravel_multi_index(grids, self.shape).ravel(), out_shape
+
+    def _read_rows(self, rows, column):
+        order = np.argsort(rows)
+        sorted_rows = rows[order]
+        values = np.empty((rows.size, 2))
+        start = 0
+        while start < sorted_rows.size:
+            lo = sorted_rows[start]
+            stop = np.searchsorted(sorted_rows, lo + self.chunk_rows)
+            block = self._results[lo:sorted_rows[stop - 1] + 1, column, :2]
+            values[start:stop] = block[sorted_rows[start:stop] - lo]
+            start = stop
+        out = np.empty_like(values)
+        out[order] = values
+        return out
+
+    def read(self, value='mean', score=None, nuclide=None, **selection):
+        """Return one value of the tally for a selection of its axes.
+
+        Each keyword names an axis and takes an int or slice; unselected axes
+        are returned whole. Axes are returned in x, y, z order followed by
+        the other filter axes.
+        """
+        unknown = set(selection) - set(self.axes)
+        if unknown:
+            raise KeyError(f"Tally '{self.name}' has no axes {sorted(unknown)}")
+        if value not in VALUES:
+            raise ValueError(f"value must be one of {VALUES}")
+        column = self._score_index(score, nuclide)
+
+        kept = [a for a in self.axes if not isinstance(selection.get(a), (int, np.integer))]
+        if self._memmap is not None:
+            index = tuple(selection.get(axis, slice(None)) for axis in self.axes)
+            data = np.asarray(self._memmap[index + (column, slice(0, 2))])
+        else:
+            rows, out_shape = self._rows(selection)
+            data = self._read_rows(rows, column).reshape(out_shape + (2,))
+
+        result = self._value(data[..., 0], data[..., 1], value)
+        order = sorted(range(len(kept)), key=lambda i: ('x', 'y', 'z').index(kept[i])
+                       if kept[i] in ('x', 'y', 'z') else 3 + i)
+        return np.transpose(result, order)
+
+    def _value(self, total, total_sq, value):
+        n = self.n_realizations
+        if value == 'sum':
+            return total
+        if value == 'sum_sq':
+            return total_sq
+        mean = total/n
+        if value == 'mean':
+            return mean
+        std = np.sqrt(np.maximum(total_sq/n - mean**2, 0.0)/max(n - 1, 1))
+        if value == 'std_dev':
+            return std
+        return np.divide(std, np.abs(mean), out=np.zeros_like(std), where=mean != 0)
+
+    def iter_slices(self, axis, value='mean', **selection):
+        """Yield ``(index, array)`` for each index along `axis`, one slice in memory at a time."""
+        for i in range(self.shape[self.axes.index(axis)]):
+            yield i, self.read(value, **{**selection, axis: i})
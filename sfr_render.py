@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import sfr_reader
+
+##############################################
+          # On-Demand Slice Rendering #
+##############################################
+
+TILE_DIR = 'tiles'
+
+# plane -> (fixed axis, horizontal axis, vertical axis)
+PLANES = {
+    'xy': ('z', 'x', 'y'),
+    'xz': ('y', 'x', 'z'),
+    'yz': ('x', 'y', 'z'),
+}
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def tile_path(statepoint, tally, plane, index, group=None, value='mean', cmap='inferno',
+              tile_dir=TILE_DIR):
+    """Return the cache path of one rendered slice.
+
+    The key covers the statepoint's path, size and modification time, so a
+    rerun that rewrites the statepoint invalidates its tiles.
+    """
+    key = json.dumps([_file_key(statepoint), tally, plane, index, group, value, cmap])
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return os.path.join(tile_dir, f"{tally.replace(' ', '_')}-{plane}{index}-{digest}.png")
+
+
+def read_slice(reader, plane, index, group=None, value='mean'):
+    """Return one plane of a mesh tally as ``(array, extent)``, indexed [horizontal, vertical]."""
+    fixed, horizontal, vertical = PLANES[plane]
+    selection = {fixed: index}
+    if 'group' in reader.axes:
+        selection['group'] = group if group is not None else slice(None)
+    data = reader.read(value, **selection)
+    if data.ndim == 3:
+        data = data.sum(axis=2)
+
+    mesh = next(iter(reader.meshes.values()))
+    lower_left = dict(zip('xyz', mesh['lower_left']))
+    upper_right = dict(zip('xyz', mesh['upper_right']))
+    extent = [lower_left[horizontal], upper_right[horizontal],
+              lower_left[vertical], upper_right[vertical]]
+    return data, extent
+
+
+def render_slice(statepoint, tally='flux 3d', plane='xy', index=0, group=None, value='mean',
+                 cmap='inferno', tile_dir=TILE_DIR):
+    """Render one XY, XZ or YZ slice of a mesh tally to PNG and return its path.
+
+    Only the requested plane is read from the statepoint, and a slice that
+    was already rendered from the same statepoint is returned from the cache.
+    """
+    path = tile_path(statepoint, tally, plane, index, group, value, cmap, tile_dir)
+    if os.path.exists(path):
+        return path
+    os.makedirs(tile_dir, exist_ok=True)
+
+    with sfr_reader.TallyReader(statepoint, tally) as reader:
+        data, extent = read_slice(reader, plane, index, group, value)
+
+    _, horizontal, vertical = PLANES[plane]
+    fig = Figure(figsize=(6, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    image = ax.imshow(data.T, origin='lower', cmap=cmap, extent=extent, aspect='equal')
+    fig.colorbar(image, ax=ax, label=value)
+    group_label = '' if group is None else f', group {group}'
+    ax.set_title(f"{tally}: {plane.upper()} slice {index}{group_label}")
+    ax.set_xlabel(f'{horizontal} [cm]')
+    ax.set_ylabel(f'{vertical} [cm]')
+    fig.tight_layout()
+
+    partial = path + '.part.png'
+    fig.savefig(partial)
+    os.replace(partial, path)
+    return path
+
+
+def axial_profile(statepoint, tally='flux 3d', group=None):
+    """Return the radially integrated axial flux profile and its axial peaking factor.
+
+    Axial planes are read one at a time, so the full tally never has to fit
+    in memory.
+    """
+    with sfr_reader.TallyReader(statepoint, tally) as reader:
+        selection = {} if group is None or 'group' not in reader.axes else {'group': group}
+        profile = np.array([plane.sum() for _, plane in reader.iter_slices('z', **selection)])
+    return profile, profile.max()/profile.mean()
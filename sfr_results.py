@@ -0,0 +1,165 @@
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+import h5py
+import openmc
+
+import sfr_post
+
+##############################################
+              # Results Index #
+##############################################
+
+RESULTS_DIR = 'results'
+INDEX = 'index.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    model_hash TEXT PRIMARY KEY,
+    created TEXT,
+    keff REAL,
+    keff_std REAL,
+    runtime REAL,
+    particles INTEGER,
+    batches INTEGER,
+    inactive INTEGER,
+    tallies TEXT,
+    settings TEXT,
+    metadata TEXT,
+    payload TEXT
+)
+"""
+
+_COLUMNS = ('model_hash', 'created', 'keff', 'keff_std', 'runtime', 'particles', 'batches',
+            'inactive', 'tallies', 'settings', 'metadata', 'payload')
+
+
+def _connect(root):
+    os.makedirs(root, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(root, INDEX), timeout=60)
+    connection.execute(_SCHEMA)
+    return connection
+
+
+def _row(root, values):
+    result = dict(zip(_COLUMNS, values))
+    for key in ('tallies', 'metadata'):
+        result[key] = json.loads(result[key]) if result[key] else None
+    result['payload'] = os.path.join(root, result['payload'])
+    return result
+
+
+def lookup(model_hash, root=RESULTS_DIR):
+    """Return the stored result for `model_hash`, or None.
+
+    An entry whose payload file has gone missing is treated as absent.
+    """
+    if not os.path.exists(os.path.join(root, INDEX)):
+        return None
+    with _connect(root) as connection:
+        values = connection.execute(f"SELECT {', '.join(_COLUMNS)} FROM results "
+                                    "WHERE model_hash = ?", (model_hash,)).fetchone()
+    if values is None:
+        return None
+    result = _row(root, values)
+    return result if os.path.exists(result['payload']) else None
+
+
+def record(model_hash, directory='.', runtime=None, metadata=None, root=RESULTS_DIR):
+    """Store the final statepoint of the run in `directory` under `model_hash`.
+
+    The statepoint itself is kept as the payload, so every tally stays
+    readable with ``openmc.StatePoint`` or :class:`sfr_reader.TallyReader`;
+    k-eff, batch counts, tally names and the exact settings.xml go into the
+    SQLite index. Returns the stored result.
+    """
+    statepoint = sfr_post.final_statepoint(directory)
+    with h5py.File(statepoint, 'r') as f:
+        tallies = [f['tallies'][key]['name'][()].decode() for key in f['tallies']
+                   if key.startswith('tally ')] if 'tallies' in f else []
+        particles = int(f['n_particles'][()])
+        batches = int(f['current_batch'][()])
+        inactive = int(f['n_inactive'][()]) if 'n_inactive' in f else 0
+        if runtime is None and 'runtime' in f:
+            runtime = float(f['runtime']['total'][()])
+    with openmc.StatePoint(statepoint) as sp:
+        keff, keff_std = sp.keff.nominal_value, sp.keff.std_dev
+
+    settings_xml = os.path.join(directory, 'settings.xml')
+    settings = open(settings_xml).read() if os.path.exists(settings_xml) else None
+
+    os.makedirs(root, exist_ok=True)
+    payload = f"{model_hash}.h5"
+    partial = os.path.join(root, payload + f'.{os.getpid()}.part')
+    shutil.copyfile(statepoint, partial)
+    os.replace(partial, os.path.join(root, payload))
+
+    values = (model_hash, datetime.datetime.now().isoformat(timespec='seconds'), keff, keff_std,
+              runtime, particles, batches, inactive, json.dumps(tallies), settings,
+              json.dumps(metadata) if metadata is not None else None, payload)
+    with _connect(root) as connection:
+        connection.execute(f"INSERT OR REPLACE INTO results ({', '.join(_COLUMNS)}) "
+                           f"VALUES ({', '.join('?'*len(_COLUMNS))})", values)
+    return _row(root, values)
+
+
+def restore(result, directory='.'):
+    """Place a stored statepoint in `directory` as its final statepoint and return its path."""
+    sfr_post.clear_statepoints(directory)
+    target = os.path.join(directory, f"statepoint.{result['batches']}.h5")
+    shutil.copyfile(result['payload'], target)
+    return target
+
+
+def run_cached(model_hash, directory='.', run=None, metadata=None, root=RESULTS_DIR):
+    """Return the result of the model exported in `directory`, running it only if new.
+
+    `run` is called with no arguments to run transport (by default
+    ``openmc.run`` in `directory`). On a cache hit the stored statepoint is
+    restored into `directory`, so post-processing reads it as if the run had
+    just finished. Returns ``(result, cached)``.
+    """
+    result = lookup(model_hash, root)
+    if result is not None:
+        restore(result, directory)
+        return result, True
+
+    sfr_post.clear_statepoints(directory)
+    start = time.perf_counter()
+    if run is None:
+        openmc.run(cwd=directory)
+    else:
+        run()
+    return record(model_hash, directory, time.perf_counter() - start, metadata, root), False
+
+
+def forget(model_hash, root=RESULTS_DIR):
+    """Remove a stored result so the next request runs transport again."""
+    result = lookup(model_hash, root)
+    with _connect(root) as connection:
+        connection.execute("DELETE FROM results WHERE model_hash = ?", (model_hash,))
+    if result is not None:
+        os.remove(result['payload'])
+
+
+def list_results(root=RESULTS_DIR):
+    """Return every stored result, newest first."""
+    if not os.path.exists(os.path.join(root, INDEX)):
+        return []
+    with _connect(root) as connection:
+        rows = connection.execute(f"SELECT {', '.join(_COLUMNS)} FROM results "
+                                  "ORDER BY created DESC").fetchall()
+    return [_row(root, values) for values in rows]
+
+
+if __name__ == '__main__':
+    root = sys.argv[1] if len(sys.argv) > 1 else RESULTS_DIR
+    for result in list_results(root):
+        print(f"{result['model_hash'][:12]}  {result['created']}  "
+              f"k-eff = {result['keff']:.5f} +/- {result['keff_std']:.5f}  "
+              f"{result['runtime'] or 0:8.1f} s  {', '.join(result['tallies'])}")
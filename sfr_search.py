@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openmc
+
+import sfr_model
+import sfr_source
+import sfr_sweep
+
+##############################################
+            # Criticality Search #
+##############################################
+
+SEARCH_DIR = 'search'
+
+# Search variables besides plain sfr_model parameters. 'pu239_shift' adds the
+# same wt% of Pu239 to both fuel zones, keeping the inner/outer zoning; U238
+# takes up the balance.
+VARIABLES = ('pu239_shift', 'sodium_density')
+
+
+def search_overrides(variable, value, params=None):
+    """Return the parameter overrides that put `variable` at `value`."""
+    params = sfr_model.make_params(**(params or {}))
+    if variable == 'pu239_shift':
+        return {'inner_pu239_wo': params['inner_pu239_wo'] + value,
+                'outer_pu239_wo': params['outer_pu239_wo'] + value}
+    if variable not in params:
+        raise KeyError(f"Unknown search variable '{variable}'")
+    return {variable: value}
+
+
+def fit_root(x, keff, keff_std, target=1.0):
+    """Fit k-eff linearly in `x` and return the root and its standard deviation.
+
+    The fit is weighted by 1/sigma^2, and the root's uncertainty is
+    propagated from the fit covariance.
+    """
+    x, keff, keff_std = (np.asarray(v, dtype=float) for v in (x, keff, keff_std))
+    (slope, intercept), cov = np.polyfit(x, keff, 1, w=1.0/keff_std, cov='unscaled')
+    root = (target - intercept)/slope
+    grad = np.array([-(target - intercept)/slope**2, -1.0/slope])
+    return root, float(np.sqrt(grad @ cov @ grad)), slope
+
+
+def particles_for(sigma_target, reference=None, minimum=2000, maximum=200000):
+    """Return the particles per batch expected to reach a k-eff standard deviation.
+
+    `reference` is ``(particles, keff_std)`` of an earlier run with the same
+    batch structure; the standard deviation scales as 1/sqrt(particles).
+    """
+    if reference is None:
+        return minimum
+    particles, std = reference
+    needed = int(np.ceil(particles*(std/sigma_target)**2))
+    return int(np.clip(needed, minimum, maximum))
+
+
+def search(kind, variable, bracket, target=1.0, params=None, tol=None, points=None,
+           max_iterations=6, batches=40, inactive=10, min_particles=2000,
+           max_particles=200000, root=SEARCH_DIR, workers=None, cores=None):
+    """Find the value of `variable` that makes k-eff equal `target`.
+
+    Every iteration runs several points across the current bracket at once
+    in a process pool, fits k-eff over all points so far and shrinks the
+    bracket to the root plus or minus two standard deviations. Points start
+    from the fission source of the previous iteration's closest point, and
+    use only enough particles to resolve k-eff across the current bracket.
+    Stops when the root's standard deviation is below `tol` (in units of
+    `variable`, default 1% of the initial bracket).
+
+    Returns ``(value, guesses, keffs)`` like :func:`openmc.search_for_keff`,
+    with `keffs` as ``(mean, std)`` pairs.
+    """
+    base = dict(params or {})
+    params = sfr_model.make_params(**base)
+    lo, hi = sorted(bracket)
+    tol = tol or 0.01*(hi - lo)
+    workers, threads = sfr_sweep.split_cores(points or sfr_sweep.available_cores(),
+                                             workers, cores)
+    points = points or max(workers, 3)
+    family = sfr_source.family_key(kind, params)
+    os.makedirs(root, exist_ok=True)
+
+    guesses, keffs, reference, value = [], [], None, None
+    for iteration in range(max_iterations):
+        xs = np.linspace(lo, hi, points)
+        if keffs:
+            slope = fit_root(guesses, *zip(*keffs), target)[2]
+            sigma = max(abs(slope)*(hi - lo)/(4*points), 1e-5)
+        else:
+            sigma = None
+        particles = particles_for(sigma, reference, min_particles, max_particles)
+
+        cases = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for j, x in enumerate(xs):
+                directory = os.path.join(root, f"iter{iteration}-{j}")
+                settings = {'particles': particles, 'batches': batches, 'inactive': inactive,
+                            'trigger_active': False}
+                settings.update(sfr_source.warm_start_settings(family, directory))
+                overrides = {**base, **search_overrides(variable, float(x), params)}
+                futures.append(pool.submit(sfr_sweep.run_case, kind, overrides, directory,
+                                           threads, settings))
+            cases = [future.result() for future in futures]
+
+        for x, case in zip(xs, cases):
+            guesses.append(float(x))
+            keffs.append((case['keff'], case['keff_std']))
+        reference = (particles, float(np.mean([c['keff_std'] for c in cases])))
+
+        closest = min(cases, key=lambda c: abs(c['keff'] - target))
+        sfr_source.store_source(closest['directory'], family)
+
+        value, value_std, _ = fit_root(guesses, *zip(*keffs), target)
+        print(f"Iteration {iteration}: {variable} = {value:.5g} +/- {value_std:.2g} "
+              f"({particles} particles)")
+        if value_std < tol:
+            break
+        lo, hi = max(lo, value - 2*value_std), min(hi, value + 2*value_std)
+        if lo >= hi:
+            lo, hi = value - 2*value_std, value + 2*value_std
+
+    with open(os.path.join(root, 'search.json'), 'w') as f:
+        json.dump({'kind': kind, 'variable': variable, 'target': target, 'value': value,
+                   'guesses': guesses, 'keffs': keffs}, f, indent=2)
+    return value, guesses, keffs
+
+
+def refine(kind, variable, initial_guess, target=1.0, params=None, tol=None, particles=20000,
+           directory=os.path.join(SEARCH_DIR, 'refine'), threads=None):
+    """Polish a search result with :func:`openmc.search_for_keff` from a warm source.
+
+    Useful after :func:`search` has narrowed the bracket; the serial secant
+    iterations then start close to the root and from a converged source.
+    """
+    params = sfr_model.make_params(**(params or {}))
+    family = sfr_source.family_key(kind, params)
+
+    def build(value):
+        model = sfr_model.build_model(kind, {**params, **search_overrides(variable, value, params)})
+        model.settings.particles = particles
+        model.settings.trigger_active = False
+        for name, setting in sfr_source.warm_start_settings(family, directory).items():
+            setattr(model.settings, name, setting)
+        return model
+
+    os.makedirs(directory, exist_ok=True)
+    run_args = {'cwd': directory, 'output': False}
+    if threads:
+        run_args['threads'] = threads
+    value, guesses, keffs = openmc.search_for_keff(build, initial_guess=initial_guess,
+                                                   target=target, tol=tol, run_args=run_args)
+    return value, guesses, keffs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parallel criticality search.")
+    parser.add_argument('kind', choices=sorted(sfr_model.BUILDERS))
+    parser.add_argument('variable', help=f"one of {VARIABLES} or any sfr_model parameter")
+    parser.add_argument('low', type=float)
+    parser.add_argument('high', type=float)
+    parser.add_argument('--target', type=float, default=1.0)
+    parser.add_argument('--tol', type=float)
+    parser.add_argument('--points', type=int)
+    parser.add_argument('--cores', type=int)
+    parser.add_argument('--refine', action='store_true')
+    args = parser.parse_args()
+
+    value, guesses, keffs = search(args.kind, args.variable, (args.low, args.high),
+                                   args.target, tol=args.tol, points=args.points,
+                                   cores=args.cores)
+    if args.refine:
+        value = refine(args.kind, args.variable, value, args.target, tol=args.tol)[0]
+    print(f"{args.variable} = {value:.6g} for k-eff = {args.target}")
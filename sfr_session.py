@@ -0,0 +1,119 @@
+import os
+
+import openmc
+import openmc.lib
+
+import sfr_model
+import sfr_source
+
+##############################################
+            # In-Memory Session #
+##############################################
+
+SESSION_DIR = 'session'
+
+
+class Session:
+    """A persistent openmc.lib session that runs many variants of one SFR model.
+
+    The model is exported and loaded once; each variant then only changes
+    material compositions, densities and cell temperatures in memory before
+    the next ``openmc.lib.run()``, so cross sections and geometry are never
+    reloaded. Only parameters in ``sfr_source.PERTURBATION_PARAMS`` can vary.
+
+    Use as a context manager; temperatures outside `temperature_range` [K]
+    have no cross sections loaded, so give it whenever variants change them::
+
+        with Session('pincell', threads=4, temperature_range=(500.0, 1000.0)) as session:
+            results = session.run_variants([{'params': {'sodium_density': 0.80}},
+                                            {'temperatures': {'sodium coolant': 900.0}}])
+    """
+
+    def __init__(self, kind='pincell', params=None, directory=SESSION_DIR, threads=None,
+                 temperature_range=None):
+        self.kind = kind
+        self.base_params = sfr_model.make_params(**(params or {}))
+        self.params = self.base_params
+        self.directory = directory
+        self.threads = threads
+        self.model = sfr_model.build_model(kind, self.base_params)
+        if temperature_range is not None:
+            # Cross sections are only loaded for temperatures inside this range.
+            self.model.settings.temperature = {'method': 'interpolation',
+                                               'range': tuple(temperature_range)}
+        self._material_ids = {m.name: m.id for m in self.model.materials}
+        self._tally_ids = {t.name: t.id for t in self.model.tallies}
+        self._cells = list(self.model.geometry.get_all_material_cells().values())
+        self._cwd = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.finish()
+
+    def start(self):
+        """Export the model and load it into openmc.lib."""
+        sfr_model.export_model(self.model, self.directory)
+        self._cwd = os.getcwd()
+        os.chdir(self.directory)
+        args = ['-s', str(self.threads)] if self.threads else None
+        openmc.lib.init(args=args, output=False)
+
+    def finish(self):
+        """Free the openmc.lib session and return to the original directory."""
+        openmc.lib.finalize()
+        if self._cwd is not None:
+            os.chdir(self._cwd)
+            self._cwd = None
+
+    def apply(self, params=None, temperatures=None):
+        """Change material data and cell temperatures in place.
+
+        `params` are sfr_model parameter overrides relative to the session's
+        base parameters; `temperatures` maps material names to the temperature
+        [K] of every cell they fill and persists until changed again.
+        """
+        new = sfr_model.make_params(**{**self.base_params, **(params or {})})
+        changed = {k for k in new if new[k] != self.params[k]}
+        fixed = changed - set(sfr_source.PERTURBATION_PARAMS)
+        if fixed:
+            raise ValueError(f"Parameters {sorted(fixed)} change the geometry; "
+                             "start a new session for them")
+
+        if changed:
+            for name, material in sfr_model.build_materials(new).items():
+                if material.name not in self._material_ids:
+                    continue
+                densities = material.get_nuclide_atom_densities()
+                lib_material = openmc.lib.materials[self._material_ids[material.name]]
+                lib_material.set_densities(list(densities), list(densities.values()))
+            self.params = new
+
+        for cell in self._cells:
+            if temperatures and cell.fill.name in temperatures:
+                openmc.lib.cells[cell.id].set_temperature(temperatures[cell.fill.name])
+
+    def run_variant(self, params=None, temperatures=None, tallies=None):
+        """Apply one variant, run it and return k-eff and the requested tally results.
+
+        The random number stream is reset before every run, so variants are
+        correlated and their differences carry less noise than independent runs.
+        """
+        self.apply(params, temperatures)
+        openmc.lib.hard_reset()
+        openmc.lib.run(output=False)
+
+        keff, keff_std = openmc.lib.keff()
+        result = {'params': params or {}, 'temperatures': temperatures or {},
+                  'keff': keff, 'keff_std': keff_std}
+        for name in (self._tally_ids if tallies is None else tallies):
+            tally = openmc.lib.tallies[self._tally_ids[name]]
+            result[name] = {'mean': tally.mean.copy(), 'std_dev': tally.std_dev.copy()}
+        return result
+
+    def run_variants(self, variants, tallies=None):
+        """Run a list of ``{'params': ..., 'temperatures': ...}`` variants in order."""
+        return [self.run_variant(v.get('params'), v.get('temperatures'), tallies)
+                for v in variants]
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import h5py
+import numpy as np
+import openmc
+
+import sfr_lattice
+import sfr_model
+import sfr_post
+
+##############################################
+              # Source Cache #
+##############################################
+
+# Parameters that perturb a model without changing its geometry. Variants that
+# differ only in these share a model family, and therefore a cached source.
+PERTURBATION_PARAMS = (
+    'inner_pu239_wo', 'inner_pu241_wo', 'outer_pu239_wo', 'outer_pu241_wo',
+    'pu238_wo', 'pu240_wo', 'pu242_wo', 'zr_wo',
+    'fuel_density', 'steel_density', 'sodium_density',
+)
+
+CACHE_DIR = 'source_cache'
+WARM_SOURCE = 'warm_source.h5'
+WARM_INACTIVE = 3
+
+
+def family_key(kind, params=None, loading=None):
+    """Return the model family of a parameter set: its kind plus its geometry.
+
+    A core `loading` map other than the parameters' default zoning is part
+    of the geometry and is appended as its :func:`sfr_lattice.loading_key`.
+    """
+    params = sfr_model.make_params(**(params or {}))
+    geometry = {k: v for k, v in params.items() if k not in PERTURBATION_PARAMS}
+    blob = json.dumps({'kind': kind, 'geometry': geometry}, sort_keys=True)
+    family = f"{kind}-{hashlib.sha256(blob.encode()).hexdigest()[:12]}"
+    if loading is not None:
+        key = sfr_lattice.loading_key(loading)
+        if key != sfr_lattice.loading_key(sfr_lattice.core_loading(params)):
+            family += f"-{key}"
+    return family
+
+
+def _family_dir(family, cache_dir):
+    return os.path.join(cache_dir, family)
+
+
+def cached_source(family, cache_dir=CACHE_DIR):
+    """Return the path of the cached source for `family`, or None."""
+    path = os.path.join(_family_dir(family, cache_dir), 'source.h5')
+    return path if os.path.exists(path) else None
+
+
+def _final_source_file(directory):
+    paths = [p for p in os.listdir(directory)
+             if p.startswith('source.') and p.endswith('.h5') and p.count('.') == 2]
+    if not paths:
+        return None
+    return os.path.join(directory, max(paths, key=lambda p: int(p.split('.')[1])))
+
+
+def source_from_statepoint(statepoint, path):
+    """Write the source bank of `statepoint` to `path` as an OpenMC source file."""
+    with h5py.File(statepoint, 'r') as src, h5py.File(path, 'w') as dst:
+        if 'source_bank' not in src:
+            raise KeyError(f"'{statepoint}' has no source bank; enable settings.sourcepoint")
+        dst.attrs['filetype'] = np.bytes_('source')
+        src.copy('source_bank', dst)
+    return path
+
+
+def store_source(directory, family, cache_dir=CACHE_DIR):
+    """Store the final fission source of the run in `directory` under `family`.
+
+    A separate ``source.N.h5`` is used when the run wrote one; otherwise the
+    source bank is copied out of the final statepoint into a source file.
+    """
+    target_dir = _family_dir(family, cache_dir)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, 'source.h5')
+    partial = target + '.part'
+
+    statepoint = sfr_post.final_statepoint(directory)
+    source_file = _final_source_file(directory)
+    if source_file is not None:
+        shutil.copyfile(source_file, partial)
+    else:
+        source_from_statepoint(statepoint, partial)
+    os.replace(partial, target)
+
+    keff, keff_std = sfr_post.read_keff(directory)
+    with open(os.path.join(target_dir, 'source.json'), 'w') as f:
+        json.dump({'statepoint': os.path.abspath(statepoint), 'keff': keff,
+                   'keff_std': keff_std, 'stored': time.time()}, f, indent=2)
+    return target
+
+
+def warm_start_settings(family, directory, inactive=WARM_INACTIVE, cache_dir=CACHE_DIR):
+    """Return settings overrides that start a run in `directory` from the cached source.
+
+    The cached source is copied next to the run so the exported settings.xml
+    refers to it by a fixed relative name. Returns an empty dict when the
+    family has no cached source yet.
+    """
+    source = cached_source(family, cache_dir)
+    if source is None:
+        return {}
+    os.makedirs(directory, exist_ok=True)
+    shutil.copyfile(source, os.path.join(directory, WARM_SOURCE))
+    return {'source': openmc.FileSource(WARM_SOURCE), 'inactive': inactive}
+
+
+def run_warm(kind, params=None, directory='.', threads=None, settings=None,
+             inactive=WARM_INACTIVE, cache_dir=CACHE_DIR):
+    """Run a model from its family's cached source and store the new converged source.
+
+    Returns ``(keff, keff_std, warm)`` where `warm` tells whether a cached
+    source was used.
+    """
+    family = family_key(kind, params)
+    overrides = dict(settings or {})
+    warm = warm_start_settings(family, directory, inactive, cache_dir)
+    overrides.update(warm)
+
+    sfr_model.prepare_model(kind, params, directory, settings=overrides)
+    sfr_post.clear_statepoints(directory)
+    openmc.run(threads=threads, cwd=directory, output=False)
+    store_source(directory, family, cache_dir)
+    return (*sfr_post.read_keff(directory), bool(warm))
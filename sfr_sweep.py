@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import openmc
+
+import sfr_model
+import sfr_results
+
+##############################################
+              # Sweep Cases #
+##############################################
+
+# Short names for the quantities we usually sweep; any sfr_model parameter
+# name is accepted as well. Each alias sets its parameters to the swept value
+# plus an offset: 'pu239' is the inner zone wt% and moves the outer zone with
+# it, so the default inner/outer zoning is kept.
+ALIASES = {
+    'pu239': {'inner_pu239_wo': 0.0,
+              'outer_pu239_wo': (sfr_model.DEFAULT_PARAMS['outer_pu239_wo']
+                                 - sfr_model.DEFAULT_PARAMS['inner_pu239_wo'])},
+    'fuel_radius': {'inner_fuel_radius': 0.0, 'outer_fuel_radius': 0.0},
+    'sodium_density': {'sodium_density': 0.0},
+    'pitch': {'pin_pitch': 0.0},
+}
+
+
+def expand_grid(grid):
+    """Return one parameter override dict per point of the Cartesian `grid`.
+
+    `grid` maps a parameter name (or a key of ``ALIASES``) to a list of values.
+    """
+    names = list(grid)
+    cases = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        overrides = {}
+        for name, value in zip(names, values):
+            for key, offset in ALIASES.get(name, {name: 0}).items():
+                overrides[key] = value + offset
+        sfr_model.make_params(**overrides)
+        cases.append(overrides)
+    return cases
+
+
+def case_name(kind, overrides, settings=None):
+    """Return a stable directory name for one sweep case."""
+    blob = json.dumps({'kind': kind, 'params': overrides, 'settings': settings or {}},
+                      sort_keys=True)
+    return f"{kind}-{hashlib.sha256(blob.encode()).hexdigest()[:12]}"
+
+
+def available_cores():
+    """Return the number of cores this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def split_cores(n_cases, workers=None, cores=None):
+    """Return ``(workers, threads)`` so that workers*threads never exceeds the cores."""
+    cores = cores or available_cores()
+    workers = max(1, min(workers or cores, n_cases, cores))
+    return workers, max(1, cores // workers)
+
+##############################################
+                # Execution #
+##############################################
+
+def run_case(kind, overrides, directory, threads=1, settings=None):
+    """Prepare and run one case in its own `directory` and return its summary.
+
+    A model that was already run, in this sweep or any earlier one, is
+    served from the sfr_results index instead of running transport again.
+    """
+    start = time.perf_counter()
+    digest, _ = sfr_model.prepare_model(kind, overrides, directory, settings=settings)
+    result, cached = sfr_results.run_cached(
+        digest, directory, run=lambda: openmc.run(threads=threads, cwd=directory, output=False),
+        metadata={'kind': kind, 'params': overrides, 'settings': settings})
+    return {
+        'case': os.path.basename(directory),
+        'kind': kind,
+        'params': overrides,
+        'model_hash': digest,
+        'keff': result['keff'],
+        'keff_std': result['keff_std'],
+        'cached': cached,
+        'threads': threads,
+        'runtime': time.perf_counter() - start,
+        'directory': directory,
+    }
+
+
+def run_sweep(kind, grid, root='sweeps', workers=None, cores=None, settings=None):
+    """Run every case of `grid` through a process pool and return the summaries.
+
+    Each case runs in ``root/<case>`` so statepoints never collide, and the
+    machine's cores are split between concurrent ``openmc.run`` instances.
+    Summaries are also written to ``root/results.json``.
+    """
+    cases = expand_grid(grid)
+    workers, threads = split_cores(len(cases), workers, cores)
+    os.makedirs(root, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_case, kind, overrides,
+                        os.path.join(root, case_name(kind, overrides, settings)), threads,
+                        settings): overrides
+            for overrides in cases
+        }
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as err:
+                results.append({'kind': kind, 'params': futures[future], 'error': str(err)})
+            print(f"[{len(results)}/{len(cases)}] {results[-1]['params']}")
+
+    with open(os.path.join(root, 'results.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def _parse_grid(items):
+    grid = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        # Integer parameters such as ring counts must stay ints for lattices and hashes.
+        convert = int if isinstance(sfr_model.DEFAULT_PARAMS.get(name), int) else float
+        grid[name] = [convert(v) for v in values.split(',')]
+    return grid
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run an SFR parameter sweep.")
+    parser.add_argument('kind', choices=sorted(sfr_model.BUILDERS))
+    parser.add_argument('grid', nargs='+', help="name=v1,v2,... e.g. pu239=11,12,13")
+    parser.add_argument('--root', default='sweeps')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--cores', type=int)
+    parser.add_argument('--particles', type=int)
+    args = parser.parse_args()
+
+    settings = {'particles': args.particles} if args.particles else None
+    for result in run_sweep(args.kind, _parse_grid(args.grid), args.root,
+                            args.workers, args.cores, settings):
+        if 'error' in result:
+            print(result['params'], 'failed:', result['error'])
+        else:
+            print(result['params'], f"k-eff = {result['keff']:.5f} +/- {result['keff_std']:.5f}")
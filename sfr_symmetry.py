@@ -0,0 +1,78 @@
+import numpy as np
+import openmc
+
+import sfr_post
+
+##############################################
+           # Sector Unfolding #
+##############################################
+
+SECTORS = {'core60': 60, 'core30': 30}
+
+
+def fold_angle(theta, sector):
+    """Map polar angles onto the equivalent angle inside a 60 or 30 degree sector."""
+    theta = np.mod(theta, np.pi/3)
+    if sector == 30:
+        theta = np.where(theta > np.pi/6, np.pi/3 - theta, theta)
+    return theta
+
+
+def bin_centers(lower_left, upper_right, shape):
+    """Return the x and y bin-centre grids, indexed ``[i, j]``, of a 2D mesh."""
+    x = np.linspace(lower_left[0], upper_right[0], shape[0] + 1)
+    y = np.linspace(lower_left[1], upper_right[1], shape[1] + 1)
+    return np.meshgrid(0.5*(x[1:] + x[:-1]), 0.5*(y[1:] + y[:-1]), indexing='ij')
+
+
+def sector_fraction(lower_left, upper_right, shape, sector, samples=8):
+    """Return the fraction of each mesh bin's area that lies inside the sector wedge."""
+    dx = (upper_right[0] - lower_left[0])/shape[0]
+    dy = (upper_right[1] - lower_left[1])/shape[1]
+    offsets = (np.arange(samples) + 0.5)/samples - 0.5
+    x, y = bin_centers(lower_left, upper_right, shape)
+    px = x[..., None, None] + dx*offsets[:, None]
+    py = y[..., None, None] + dy*offsets[None, :]
+    theta = np.arctan2(py, px)
+    inside = (theta >= 0.0) & (theta <= np.radians(sector))
+    return inside.mean(axis=(-2, -1))
+
+
+def unfold(flux_xy, lower_left, upper_right, sector):
+    """Return a full-core map from a 2D mesh tally of a 60 or 30 degree sector.
+
+    Bins cut by the sector planes only collect part of their track length, so
+    each bin is first divided by the fraction of its area inside the wedge.
+    Every full-core bin then takes the value of the sector bin its centre
+    folds onto; bins that fold off the mesh are zero.
+    """
+    flux_xy = np.asarray(flux_xy, dtype=float)
+    shape = flux_xy.shape
+    fraction = sector_fraction(lower_left, upper_right, shape, sector)
+    density = np.divide(flux_xy, fraction, out=np.zeros_like(flux_xy), where=fraction > 0)
+
+    x, y = bin_centers(lower_left, upper_right, shape)
+    r = np.hypot(x, y)
+    theta = fold_angle(np.arctan2(y, x), sector)
+    fx, fy = r*np.cos(theta), r*np.sin(theta)
+
+    dx = (upper_right[0] - lower_left[0])/shape[0]
+    dy = (upper_right[1] - lower_left[1])/shape[1]
+    i = np.floor((fx - lower_left[0])/dx).astype(int)
+    j = np.floor((fy - lower_left[1])/dy).astype(int)
+    on_mesh = (i >= 0) & (i < shape[0]) & (j >= 0) & (j < shape[1])
+    full = np.zeros_like(density)
+    full[on_mesh] = density[i[on_mesh], j[on_mesh]]
+    return full
+
+
+def unfold_flux(kind, directory='.', tally_name='flux'):
+    """Return the normalized full-core XY flux map of a sector run in `directory`."""
+    with openmc.StatePoint(sfr_post.final_statepoint(directory)) as sp:
+        tally = sp.get_tally(name=tally_name)
+        mesh = tally.find_filter(openmc.MeshFilter).mesh
+        flux = tally.mean.reshape(mesh.dimension, order='F').sum(axis=2)
+        lower_left, upper_right = mesh.lower_left, mesh.upper_right
+
+    full = unfold(flux, lower_left, upper_right, SECTORS[kind])
+    return full/full.max()
@@ -0,0 +1,136 @@
+import copy
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import openmc
+
+import sfr_model
+import sfr_post
+import sfr_source
+
+##############################################
+             # Weight Windows #
+##############################################
+
+WW_DIR = 'weight_windows'
+WW_FILE = 'weight_windows.h5'
+
+
+def ww_mesh(params=None, dimension=(100, 100, 1)):
+    """Return a weight window mesh over the same 300 x 300 cm area as the core flux tally.
+
+    It is a separate mesh object from the tally's, so settings.xml and
+    tallies.xml never define the same mesh ID twice.
+    """
+    params = sfr_model.make_params(**(params or {}))
+    half_height = params['core_height']/2
+    mesh = openmc.RegularMesh(name='weight windows')
+    mesh.dimension = list(dimension)
+    mesh.lower_left = [-150, -150, -half_height]
+    mesh.upper_right = [150, 150, half_height]
+    return mesh
+
+
+def cached_weight_windows(family, ww_dir=WW_DIR):
+    """Return the path of the stored weight windows for a model family, or None."""
+    path = os.path.join(ww_dir, f"{family}.h5")
+    return path if os.path.exists(path) else None
+
+
+def apply_weight_windows(model, path):
+    """Switch on the weight windows stored in `path` for `model`."""
+    windows = openmc.hdf5_to_wws(path)
+    for mesh in {id(ww.mesh): ww.mesh for ww in windows}.values():
+        # Renumber the loaded mesh so it cannot collide with the model's meshes.
+        mesh.id = None
+    model.settings.weight_windows = windows
+    model.settings.weight_windows_on = True
+    return windows
+
+
+def generate_weight_windows(kind='core', params=None, directory=os.path.join(WW_DIR, 'generate'),
+                            iterations=2, particles=10000, batches=30, inactive=10,
+                            threads=None, ww_dir=WW_DIR, model=None, family=None):
+    """Generate weight windows for a model family with OpenMC's MAGIC generator and store them.
+
+    Each iteration runs a short, trigger-free calculation with the windows
+    from the previous iteration switched on, so histories reach the
+    reflector and peripheral assemblies and the next set of windows is
+    better resolved there. The windows are generated on a copy of `model`
+    when given, otherwise on the model `kind` built from `params`, and are
+    stored under `family`. Returns the path of the stored windows.
+    """
+    family = family or sfr_source.family_key(kind, params)
+    base = model
+    previous = None
+    for iteration in range(iterations):
+        model = sfr_model.build_model(kind, params) if base is None else copy.deepcopy(base)
+        model.settings.particles = particles
+        model.settings.batches = batches
+        model.settings.inactive = inactive
+        model.settings.trigger_active = False
+        generator = openmc.WeightWindowGenerator(ww_mesh(params), method='magic',
+                                                 max_realizations=batches - inactive)
+        model.settings.weight_window_generators = [generator]
+        if previous is not None:
+            apply_weight_windows(model, previous)
+
+        sfr_model.export_model(model, directory)
+        sfr_post.clear_statepoints(directory)
+        openmc.run(threads=threads, cwd=directory, output=False)
+
+        previous = os.path.join(directory, f"{WW_FILE}.{iteration}")
+        shutil.copyfile(os.path.join(directory, WW_FILE), previous)
+
+    os.makedirs(ww_dir, exist_ok=True)
+    target = os.path.join(ww_dir, f"{family}.h5")
+    shutil.copyfile(previous, target + '.part')
+    os.replace(target + '.part', target)
+    with open(os.path.join(ww_dir, f"{family}.json"), 'w') as f:
+        json.dump({'kind': kind, 'family': family, 'params': params or {},
+                   'iterations': iterations, 'particles': particles, 'batches': batches},
+                  f, indent=2)
+    return target
+
+
+def use_weight_windows(model, kind='core', params=None, ww_dir=WW_DIR, family=None, **kwargs):
+    """Apply the stored weight windows of the model's family, generating them on first use.
+
+    Pass the `family` the caller keys its runs by when the model differs
+    from the plain `kind` built from `params`, e.g. a multigroup model or a
+    custom loading; new windows are then generated on a copy of `model`.
+    """
+    family = family or sfr_source.family_key(kind, params)
+    path = cached_weight_windows(family, ww_dir) or generate_weight_windows(
+        kind, params, ww_dir=ww_dir, model=model, family=family, **kwargs)
+    apply_weight_windows(model, path)
+    return path
+
+##############################################
+            # Error Flatness #
+##############################################
+
+def error_flatness(directory='.', tally_name='flux', threshold=0.05):
+    """Return statistics of a mesh tally's relative errors over its non-empty bins.
+
+    A flat map has a max/median ratio near one; `above` is the fraction of
+    scored bins whose relative error exceeds `threshold`.
+    """
+    mean, std, _ = sfr_post.read_mesh_tally(directory, tally_name)
+    scored = mean > 0
+    rel_err = std[scored]/mean[scored]
+    return {
+        'bins': int(scored.sum()),
+        'median': float(np.median(rel_err)),
+        'max': float(rel_err.max()),
+        'max_over_median': float(rel_err.max()/np.median(rel_err)),
+        'above': float(np.mean(rel_err > threshold)),
+    }
+
+
+if __name__ == '__main__':
+    kind = sys.argv[1] if len(sys.argv) > 1 else 'core'
+    print(generate_weight_windows(kind))
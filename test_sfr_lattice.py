@@ -0,0 +1,22 @@
+import pytest
+
+openmc = pytest.importorskip('openmc')
+
+import sfr_lattice
+import sfr_pins
+
+
+@pytest.mark.parametrize('orientation', ['x', 'y'])
+def test_symbols_at_heterogeneous_map(orientation):
+    """A map whose ring sector is not mirror-symmetric must not select mirrored assemblies."""
+    spec = sfr_lattice.parse_loading_map(
+        f"rings 4\norientation {orientation}\nsymmetry 6\nring 0-2 I\nring 3 I I O\n")
+    universes = {symbol: openmc.Universe(name=symbol) for symbol in 'IO'}
+    lattice = sfr_lattice.build_lattice(spec, universes, pitch=1.0)
+
+    x, a = sfr_pins.lattice_indices(spec['rings'])
+    ring = sfr_pins.hex_distance(x, a)
+    position = sfr_pins.ring_positions(x, a, 1.0, orientation)
+    symbols = sfr_lattice.symbols_at(spec, ring, position)
+    for xi, ai, symbol in zip(x, a, symbols):
+        assert lattice.get_universe((int(xi), int(ai))).name == symbol
@@ -0,0 +1,24 @@
+import pytest
+
+openmc = pytest.importorskip('openmc')
+
+import sfr_pins
+
+
+@pytest.mark.parametrize('orientation', ['x', 'y'])
+@pytest.mark.parametrize('n_rings', [1, 2, 3, 5])
+def test_ring_positions_match_openmc(orientation, n_rings):
+    """Every (x, alpha) element must map to the universe OpenMC places there."""
+    universes = [[openmc.Universe() for _ in range(6*r if r else 1)]
+                 for r in range(n_rings - 1, -1, -1)]
+    lattice = openmc.HexLattice()
+    lattice.center = (0., 0.)
+    lattice.pitch = (1.0,)
+    lattice.orientation = orientation
+    lattice.universes = universes
+
+    x, a = sfr_pins.lattice_indices(n_rings)
+    ring = sfr_pins.hex_distance(x, a)
+    position = sfr_pins.ring_positions(x, a, 1.0, orientation)
+    for xi, ai, r, p in zip(x, a, ring, position):
+        assert lattice.get_universe((int(xi), int(ai))) is universes[n_rings - 1 - r][p]